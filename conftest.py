@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def thumbnails_in_request_thread(settings):
+    """Миниатюры строятся сразу после фиксации, а не в пуле потоков.
+
+    Фикстуры тестов удаляют MEDIA_ROOT сразу после запроса: фоновый
+    поток дописывал бы миниатюры в уже удаляемый каталог.
+    """
+    settings.POST_THUMBNAIL_WORKERS = 0
@@ -0,0 +1,94 @@
+import json
+import statistics
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slow_queries import log_paths
+
+SORT_KEYS = ('total', 'count', 'max', 'p95')
+
+
+class Command(BaseCommand):
+    help = 'Сводка журнала медленных запросов: самые тяжёлые отпечатки'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', help='Журнал (по умолчанию SLOW_QUERY_LOG)')
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Сколько отпечатков показать'
+        )
+        parser.add_argument(
+            '--sort', choices=SORT_KEYS, default='total',
+            help='По чему упорядочить: суммарное время, число, максимум '
+                 'или p95'
+        )
+
+    def handle(self, *args, **options):
+        paths = log_paths(options['log'])
+        if not paths:
+            raise CommandError('Журнал медленных запросов пуст')
+        groups = {}
+        for path in paths:
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.add(groups, entry)
+        summaries = sorted(
+            (self.summarize(digest, group)
+             for digest, group in groups.items()),
+            key=lambda summary: summary[options['sort']], reverse=True,
+        )
+        for summary in summaries[:options['top']]:
+            self.print_summary(summary)
+
+    def add(self, groups, entry):
+        group = groups.setdefault(entry['fingerprint'], {
+            'durations': [], 'views': Counter(), 'sites': Counter(),
+            'sql': None, 'plan': None,
+        })
+        group['durations'].append(entry['duration_ms'])
+        group['views'][entry.get('view') or '-'] += 1
+        group['sites'][entry.get('site') or '-'] += 1
+        # Файлы читаются от старых к новым: остаётся последний план.
+        if entry.get('sql'):
+            group['sql'] = entry['sql']
+        if entry.get('plan'):
+            group['plan'] = entry['plan']
+
+    def summarize(self, digest, group):
+        durations = group['durations']
+        cuts = (statistics.quantiles(durations, n=100, method='inclusive')
+                if len(durations) > 1 else durations * 99)
+        return {
+            'fingerprint': digest,
+            'count': len(durations),
+            'total': sum(durations),
+            'max': max(durations),
+            'p50': cuts[49],
+            'p95': cuts[94],
+            'views': group['views'].most_common(3),
+            'sites': group['sites'].most_common(3),
+            'sql': group['sql'],
+            'plan': group['plan'],
+        }
+
+    def print_summary(self, summary):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{summary["fingerprint"]}: {summary["count"]} раз, '
+            f'всего {summary["total"]:.0f} мс, p50 {summary["p50"]:.1f}, '
+            f'p95 {summary["p95"]:.1f}, максимум {summary["max"]:.1f} мс'))
+        self.stdout.write('  Представления: ' + ', '.join(
+            f'{view} ({count})' for view, count in summary['views']))
+        self.stdout.write('  Места в коде: ' + ', '.join(
+            f'{site} ({count})' for site, count in summary['sites']))
+        if summary['sql']:
+            self.stdout.write(f'  SQL: {summary["sql"]}')
+        if summary['plan']:
+            self.stdout.write('  План:')
+            for line in summary['plan']:
+                self.stdout.write(f'    {line}')
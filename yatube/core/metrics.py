@@ -0,0 +1,430 @@
+"""Метрики запросов в формате Prometheus.
+
+``MetricsMiddleware`` (``core.middleware``) замеряет каждый запрос:
+время ответа, число и время SQL-запросов, время рендеринга шаблонов
+и размер ответа — с меткой имени представления из ``resolver_match``.
+Обращения к кэшу считает бэкенд ``MeteredLocMemCache`` с меткой
+семейства ключей: ``cache_page``, ``posts:generation`` и т. п. Кэш
+страниц сначала читает ключ заголовков (семейство ``cache_header``) и
+без него тело не ищет: промахи ``cache_header`` — это запросы, для
+которых страницы в кэше не было.
+
+Каждый процесс копит метрики в памяти. Если задан ``METRICS_DIR``,
+процесс не реже раза в ``METRICS_FLUSH_INTERVAL`` секунд сбрасывает
+их в свой файл в этом каталоге, а ``/metrics`` складывает файлы всех
+процессов — так счётчики видны целиком при нескольких воркерах.
+Файлы завершившихся процессов при чтении ``/metrics`` складываются в
+один ``exited.json``: их счётчики не пропадают, а число файлов не
+растёт с каждым перезапуском воркера. Живость процесса проверяется по
+pid, поэтому каталог не должен быть общим для нескольких хостов или
+контейнеров. Как и в многопроцессном режиме клиента Prometheus,
+каталог очищают при развёртывании — иначе счётчики копятся между
+версиями.
+"""
+import atexit
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STREAM_BUCKETS = (1, 2, 3, 5, 10, 20, 50)
+ROW_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Имя: тип, описание и границы корзин для гистограмм.
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Запросы по представлению, методу и коду ответа', None),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа', LATENCY_BUCKETS),
+    'yatube_db_queries': (
+        'histogram', 'SQL-запросов за один запрос', QUERY_BUCKETS),
+    'yatube_db_duration_seconds': (
+        'histogram', 'Время SQL-запросов за один запрос', LATENCY_BUCKETS),
+    'yatube_template_render_seconds': (
+        'histogram', 'Время рендеринга шаблонов за один запрос',
+        LATENCY_BUCKETS),
+    'yatube_response_size_bytes': (
+        'histogram', 'Размер тела ответа', SIZE_BUCKETS),
+    'yatube_cache_requests_total': (
+        'counter', 'Чтения кэша по семейству ключей и результату', None),
+    'yatube_timeline_merge_streams': (
+        'histogram', 'Потоков в одном слиянии ленты подписок',
+        STREAM_BUCKETS),
+    'yatube_timeline_merge_rows': (
+        'histogram', 'Записей, прочитанных из потоков за одно слияние',
+        ROW_BUCKETS),
+    'yatube_timeline_merge_duration_seconds': (
+        'histogram', 'Время одного слияния ленты подписок',
+        LATENCY_BUCKETS),
+}
+
+SNAPSHOT_RE = re.compile(r'^(\d+)-\d+\.json$')
+EXITED_FILE = 'exited.json'
+
+UNRESOLVED = 'unresolved'
+CACHE_PAGE_PREFIX = 'views.decorators.cache.'
+KEY_SEPARATOR_RE = re.compile(r'[:|.]+')
+
+
+class Registry:
+    """Метрики процесса: счётчики и гистограммы по набору меток."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.started = time.time()
+        self.flushed = 0
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = {
+                    'buckets': [0] * (len(buckets) + 1),
+                    'sum': 0,
+                    'count': 0,
+                }
+            index = next(
+                (i for i, bound in enumerate(buckets) if value <= bound),
+                len(buckets))
+            histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                [name, dict(labels), value if isinstance(value, (int, float))
+                 else {**value, 'buckets': list(value['buckets'])}]
+                for (name, labels), value in self.values.items()
+            ]
+
+    def path(self):
+        return os.path.join(
+            settings.METRICS_DIR,
+            f'{os.getpid()}-{int(self.started * 1000)}.json')
+
+    def flush(self, force=False):
+        """Записать метрики процесса в его файл в ``METRICS_DIR``."""
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        _write_json(self.path(), self.snapshot())
+
+    def collect(self):
+        """Метрики всех процессов, сложенные вместе."""
+        if not settings.METRICS_DIR:
+            return merge([self.snapshot()])
+        self.flush(force=True)
+        with _directory_lock():
+            exited = compact(settings.METRICS_DIR)
+            snapshots = [exited['metrics']]
+            for name in os.listdir(settings.METRICS_DIR):
+                if SNAPSHOT_RE.match(name):
+                    snapshot = _read_json(
+                        os.path.join(settings.METRICS_DIR, name))
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+        return merge(snapshots)
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        # Файл мог исчезнуть при очистке каталога.
+        return None
+
+
+def _write_json(path, data):
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+@contextmanager
+def _directory_lock():
+    """Блокировка ``METRICS_DIR`` между процессами на время чтения."""
+    descriptor = os.open(settings.METRICS_DIR, os.O_RDONLY)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(descriptor)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def compact(directory):
+    """Сложить файлы завершившихся процессов в ``EXITED_FILE``.
+
+    Вызывается под ``_directory_lock``. Имена сложенных файлов пишутся
+    в ``EXITED_FILE`` вместе с суммой: если процесс упадёт до их
+    удаления, при следующем вызове они только удаляются и не
+    учитываются дважды. Возвращает содержимое ``EXITED_FILE``.
+    """
+    path = os.path.join(directory, EXITED_FILE)
+    exited = _read_json(path) or {'merged': [], 'metrics': []}
+    present = set(os.listdir(directory))
+    stale = [name for name in exited['merged'] if name in present]
+    names = [
+        name for name in sorted(present)
+        if SNAPSHOT_RE.match(name) and name not in stale
+        and not process_alive(int(name.split('-', 1)[0]))
+    ]
+    if not names and not stale:
+        return exited
+    snapshots = [exited['metrics']]
+    for name in names:
+        snapshot = _read_json(os.path.join(directory, name))
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    exited = {
+        'merged': names + stale,
+        'metrics': [
+            [name, dict(labels), value]
+            for (name, labels), value in merge(snapshots).items()
+        ],
+    }
+    _write_json(path, exited)
+    for name in exited['merged']:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    return exited
+
+
+def merge(snapshots):
+    """Сумма снимков: ``{(имя, метки): значение}``."""
+    values = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot:
+            key = (name, tuple(sorted(labels.items())))
+            if not isinstance(value, dict):
+                values[key] = values.get(key, 0) + value
+                continue
+            total = values.setdefault(key, {
+                'buckets': [0] * len(value['buckets']), 'sum': 0,
+                'count': 0,
+            })
+            total['buckets'] = [
+                a + b for a, b in zip(total['buckets'], value['buckets'])]
+            total['sum'] += value['sum']
+            total['count'] += value['count']
+    return values
+
+
+def _labels(labels, **extra):
+    labels = [*labels, *extra.items()]
+    if not labels:
+        return ''
+    text = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"').replace('\n', r'\n'))
+        for name, value in labels)
+    return '{' + text + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(values):
+    """Текстовый формат Prometheus для сложенных метрик."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted(
+            (labels, value) for (metric, labels), value in values.items()
+            if metric == name)
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(
+                    [*map(str, buckets), '+Inf'], value['buckets']):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} '
+                         f'{_number(value["sum"])}')
+            lines.append(f'{name}_count{_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush, force=True)
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Счётчики одного запроса; ``__call__`` — обёртка SQL-запросов."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - started
+
+
+def current_request():
+    return getattr(_local, 'request', None)
+
+
+@contextmanager
+def collecting(request_metrics):
+    """Считать SQL и рендеринг шаблонов потока в ``request_metrics``."""
+    _local.request = request_metrics
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(request_metrics))
+            yield request_metrics
+    finally:
+        _local.request = None
+
+
+def record_request(request, response, request_metrics, duration):
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else UNRESOLVED
+    registry.inc(
+        'yatube_requests_total', view=view, method=request.method,
+        status=response.status_code)
+    registry.observe('yatube_request_duration_seconds', duration, view=view)
+    registry.observe(
+        'yatube_db_queries', request_metrics.queries, view=view)
+    registry.observe(
+        'yatube_db_duration_seconds', request_metrics.query_time, view=view)
+    registry.observe(
+        'yatube_template_render_seconds', request_metrics.template_time,
+        view=view)
+    if not response.streaming:
+        registry.observe(
+            'yatube_response_size_bytes', len(response.content), view=view)
+    registry.flush()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        request_metrics = current_request()
+        if request_metrics is None or request_metrics.template_depth:
+            # Вложенный рендеринг (например, карточки постов) уже
+            # входит во время внешнего шаблона.
+            return super().render(context, request)
+        request_metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            request_metrics.template_depth -= 1
+            request_metrics.template_time += time.perf_counter() - started
+
+
+class MeteredDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django с замером времени рендеринга."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self)
+
+
+def key_family(key):
+    """Семейство ключа кэша для метки: без идентификаторов объектов."""
+    if key.startswith(CACHE_PAGE_PREFIX):
+        return key[len(CACHE_PAGE_PREFIX):].split('.', 1)[0]
+    return ':'.join(KEY_SEPARATOR_RE.split(key)[:2])
+
+
+_MISSING = object()
+
+
+class CacheMetricsMixin:
+    """Считает попадания и промахи ``get`` и ``get_many`` бэкенда кэша."""
+
+    @contextmanager
+    def _outermost(self):
+        # get_many базового класса вызывает get: считаем только внешний
+        # вызов.
+        outer = not getattr(_local, 'in_cache', False)
+        _local.in_cache = True
+        try:
+            yield outer
+        finally:
+            if outer:
+                _local.in_cache = False
+
+    def _count(self, keys, found):
+        for key in keys:
+            registry.inc(
+                'yatube_cache_requests_total', family=key_family(str(key)),
+                result='hit' if key in found else 'miss')
+
+    def get(self, key, default=None, version=None):
+        with self._outermost() as outer:
+            value = super().get(key, _MISSING, version)
+        if outer:
+            self._count([key], () if value is _MISSING else (key,))
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with self._outermost() as outer:
+            found = super().get_many(keys, version)
+        if outer:
+            self._count(keys, found)
+        return found
+
+
+class MeteredLocMemCache(CacheMetricsMixin, LocMemCache):
+    pass
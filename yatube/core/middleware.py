@@ -0,0 +1,48 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .slow_queries import SlowQueryRecorder
+
+
+class MetricsMiddleware:
+    """Замеры запроса для ``/metrics`` (см. ``core.metrics``).
+
+    Стоит первым в ``MIDDLEWARE``, чтобы время ответа включало все
+    остальные промежуточные слои.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        started = time.perf_counter()
+        with metrics.collecting(request_metrics):
+            response = self.get_response(request)
+        metrics.record_request(
+            request, response, request_metrics,
+            time.perf_counter() - started)
+        return response
+
+
+class SlowQueryMiddleware:
+    """Журнал медленных SQL-запросов (см. ``core.slow_queries``)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SLOW_QUERY_THRESHOLD_MS is None:
+            return self.get_response(request)
+        recorder = SlowQueryRecorder(request)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                return self.get_response(request)
+        finally:
+            recorder.flush()
@@ -0,0 +1,232 @@
+"""Журнал медленных SQL-запросов.
+
+``SlowQueryMiddleware`` (``core.middleware``) оборачивает запросы к
+базе на время обработки HTTP-запроса. Запрос дольше
+``SLOW_QUERY_THRESHOLD_MS`` попадает в журнал ``SLOW_QUERY_LOG``
+(JSON Lines, ротация по размеру) вместе с представлением и местом в
+коде проекта, откуда он выполнен.
+
+План и запись в журнал откладываются до готовности ответа, чтобы
+не входить во время SQL-запросов в метриках (``core.metrics``).
+
+Запросы сравниваются по отпечатку — SQL без значений параметров,
+чисел и длины списков ``IN (…)``. Полный текст и план выполнения
+(``EXPLAIN QUERY PLAN`` на SQLite) пишутся для отпечатка не чаще раза
+в ``SLOW_QUERY_EXPLAIN_INTERVAL`` секунд; остальные записи короткие.
+Сводку по журналу выводит команда ``slow_queries``.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.utils import timezone
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+IN_LIST_RE = re.compile(r'\bIN \(\?(?:, \?)*\)', re.I)
+VALUES_RE = re.compile(r'(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+')
+SPACE_RE = re.compile(r'\s+')
+EXPLAIN_SAVEPOINT = 'slow_query_explain'
+
+logger = logging.getLogger(__name__)
+journal = logging.getLogger(f'{__name__}.journal')
+# Модули замеров: их кадры есть в стеке каждого запроса к базе.
+INSTRUMENTATION_FILES = {
+    __file__,
+    *(os.path.join(os.path.dirname(__file__), name)
+      for name in ('metrics.py', 'middleware.py')),
+}
+_log_lock = threading.Lock()
+_explained = {}
+_explained_lock = threading.Lock()
+
+
+def normalize(sql):
+    """SQL без конкретных значений: одинаков для однотипных запросов."""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = VALUES_RE.sub(r'\1, ...', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:16]
+
+
+def call_site():
+    """Ближайший к запросу кадр стека из кода проекта.
+
+    Кадры ``INSTRUMENTATION_FILES`` пропускаются.
+    """
+    base = settings.BASE_DIR + os.sep
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if not frame.filename.startswith(base):
+            continue
+        if frame.filename in INSTRUMENTATION_FILES or (
+                'site-packages' in frame.filename):
+            continue
+        path = os.path.relpath(frame.filename, settings.BASE_DIR)
+        return f'{path}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def _fetch_plan(connection, statement, params):
+    # Курсор бэкенда без обёрток Django: EXPLAIN не должен сам попасть
+    # ни в этот журнал, ни в метрики запроса. Ошибки такого курсора —
+    # исключения драйвера, а не DatabaseError Django.
+    cursor = connection.create_cursor()
+    # Внутри транзакции ошибка EXPLAIN на PostgreSQL прервала бы её:
+    # после ошибки откатываемся к своей точке сохранения.
+    savepoint = connection.in_atomic_block
+    try:
+        if savepoint:
+            cursor.execute(f'SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        try:
+            cursor.execute(statement, params)
+            return cursor.fetchall()
+        except connection.Database.Error:
+            if savepoint:
+                cursor.execute(f'ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}')
+            raise
+        finally:
+            if savepoint:
+                cursor.execute(f'RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}')
+    finally:
+        cursor.close()
+
+
+def explain(connection, sql, params):
+    """План выполнения запроса строками или текст ошибки."""
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif sql.lstrip().upper().startswith('SELECT'):
+        prefix = 'EXPLAIN '
+    else:
+        return None
+    try:
+        rows = _fetch_plan(connection, prefix + sql, params)
+    except connection.Database.Error as error:
+        return [f'Не удалось получить план: {error}']
+    if connection.vendor == 'sqlite':
+        # Строки (id, parent, notused, detail): отступ по глубине.
+        depth = {0: -1}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node] + detail)
+        return lines
+    return [' '.join(map(str, row)) for row in rows]
+
+
+def should_explain(digest):
+    now = time.monotonic()
+    with _explained_lock:
+        last = _explained.get(digest)
+        if last is not None and (
+                now - last < settings.SLOW_QUERY_EXPLAIN_INTERVAL):
+            return False
+        _explained[digest] = now
+        return True
+
+
+def get_handler():
+    """Обработчик журнала: создаётся при первой записи."""
+    path = os.path.abspath(settings.SLOW_QUERY_LOG)
+    with _log_lock:
+        handler = getattr(journal, 'handler', None)
+        if handler is not None and handler.baseFilename == path:
+            return handler
+        if handler is not None:
+            journal.removeHandler(handler)
+            handler.close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+            encoding='utf-8',
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        journal.addHandler(handler)
+        journal.setLevel(logging.INFO)
+        journal.propagate = False
+        journal.handler = handler
+        return handler
+
+
+def write(entry):
+    get_handler()
+    journal.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+def log_paths(path=None):
+    """Файлы журнала от старых к новым, с учётом ротации."""
+    path = path or settings.SLOW_QUERY_LOG
+    backups = [
+        f'{path}.{number}'
+        for number in range(settings.SLOW_QUERY_LOG_BACKUPS, 0, -1)
+    ]
+    return [name for name in [*backups, path] if os.path.exists(name)]
+
+
+class SlowQueryRecorder:
+    """Обёртка ``execute_wrapper``: копит медленные запросы.
+
+    Обёртка только замеряет запрос и запоминает место в коде, а план
+    и запись в журнал делает ``flush`` после ответа — их время не
+    добавляется ко времени SQL-запросов в метриках.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.pending = []
+
+    def view(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - started) * 1000
+        if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+            self.pending.append((
+                context['connection'], sql, params, many, duration,
+                timezone.now(), call_site(),
+            ))
+        return result
+
+    def flush(self):
+        """Записать накопленные запросы в журнал."""
+        pending, self.pending = self.pending, []
+        for query in pending:
+            self.record(*query)
+
+    def record(self, connection, sql, params, many, duration, when, site):
+        digest = fingerprint(sql)
+        entry = {
+            'time': when.isoformat(),
+            'fingerprint': digest,
+            'duration_ms': round(duration, 3),
+            'view': self.view(),
+            'path': getattr(self.request, 'path', None),
+            'site': site,
+        }
+        if should_explain(digest):
+            entry['sql'] = normalize(sql)
+            if not many:
+                entry['plan'] = explain(connection, sql, params)
+        try:
+            write(entry)
+        except OSError:
+            logger.exception('Не удалось записать медленный запрос')
@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import registry, render as render_metrics
+
 
 def page_not_found(request, exception):
     return render(request, "core/404.html", {"path": request.path}, status=404)
@@ -11,3 +17,27 @@ def csrf_failure(request, reason=""):
 
 def server_error(request):
     return render(request, "core/500.html", status=500)
+
+
+def metrics_allowed(request):
+    """Доступ к ``/metrics``: по токену, если он задан, иначе по адресу.
+
+    За обратным прокси все запросы приходят с его адреса, поэтому в
+    таком развёртывании нужен ``METRICS_TOKEN`` (Prometheus передаёт
+    его в ``Authorization: Bearer``) или закрытый на прокси ``/metrics``.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        return hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', '').encode(),
+            expected.encode())
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics(request):
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(
+        render_metrics(registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,5 +1,7 @@
 from django.contrib import admin
 from .models import Post, Group
+from .paginators import CachedCountPaginator
+from .search import filter_matching
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,10 +13,40 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    # Полное число постов без фильтров не считаем: это COUNT(*) по всей
+    # таблице на каждую страницу списка.
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return CachedCountPaginator(
+            queryset, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+        )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs)
+        if db_field.name == 'group' and formfield is not None:
+            # Поле группы есть в каждой строке списка (list_editable):
+            # список групп читается один раз на запрос, а не на строку.
+            if not hasattr(request, '_group_choices'):
+                # iter(): иначе list() сначала спросит len() — лишний COUNT.
+                request._group_choices = list(iter(formfield.choices))
+            formfield.choices = request._group_choices
+        return formfield
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 вместо LIKE '%…%' по всему тексту.
+        if not search_term.strip():
+            return queryset, False
+        return filter_matching(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -0,0 +1,191 @@
+"""Замеры представлений: задержка и число SQL-запросов.
+
+Каждый сценарий — запрос к одному представлению от имени самого
+активного читателя набора данных. Запрос повторяется ``iterations``
+раз в двух режимах: ``cold`` — перед каждым запросом кэш очищается,
+``warm`` — кэш остаётся от прошлых запросов.
+
+У каждого представления есть бюджет запросов в холодном режиме
+(``QUERY_BUDGETS``): он не должен зависеть от размера данных, иначе
+где-то запросы в цикле. Задержка сравнивается с сохранённым базовым
+замером с допуском ``tolerance``.
+"""
+import statistics
+import time
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Group, Post
+
+User = get_user_model()
+
+MODES = ('cold', 'warm')
+PERCENTILES = (50, 95, 99)
+# Допуск на шум таймера для быстрых представлений, мс.
+LATENCY_SLACK_MS = 2.0
+
+# Наборы данных: параметры команды seed_load.
+DATASETS = {
+    'small': {
+        'users': 200, 'groups': 10, 'posts': 2000,
+        'comments': 4000, 'follows': 2000,
+    },
+    'medium': {
+        'users': 2000, 'groups': 50, 'posts': 20000,
+        'comments': 40000, 'follows': 20000,
+    },
+    'large': {
+        'users': 20000, 'groups': 200, 'posts': 200000,
+        'comments': 400000, 'follows': 200000,
+    },
+}
+
+# Наибольшее число запросов представления при пустом кэше.
+QUERY_BUDGETS = {
+    'index': 6,
+    'group_posts': 7,
+    'profile': 8,
+    'post_detail': 8,
+    'follow_index': 7,
+    'add_comment': 8,
+    'post_create': 14,
+}
+
+Targets = namedtuple('Targets', 'reader author group post')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def find_targets():
+    """Самые нагруженные объекты набора данных."""
+    reader = User.objects.order_by('-stats__following_count', 'pk').first()
+    author = User.objects.order_by('-stats__posts_count', 'pk').first()
+    group = Group.objects.annotate(
+        posts=Count('group_posts')).order_by('-posts', 'pk').first()
+    post = Post.objects.order_by('-comments_count', 'pk').first()
+    if None in (reader, author, group, post):
+        raise BenchmarkError('Нет данных для замеров: запустите seed_load')
+    return Targets(reader, author.username, group, post.pk)
+
+
+def scenarios(targets):
+    """Сценарии: имя представления и функция запроса от клиента."""
+    return {
+        'index': lambda client: client.get(reverse('posts:index')),
+        'group_posts': lambda client: client.get(reverse(
+            'posts:group_list', args=[targets.group.slug])),
+        'profile': lambda client: client.get(reverse(
+            'posts:profile', args=[targets.author])),
+        'post_detail': lambda client: client.get(reverse(
+            'posts:post_detail', args=[targets.post])),
+        'follow_index': lambda client: client.get(
+            reverse('posts:follow_index')),
+        'add_comment': lambda client: client.post(
+            reverse('posts:add_comment', args=[targets.post]),
+            {'text': 'Комментарий для замера'}),
+        'post_create': lambda client: client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост для замера', 'group': targets.group.pk}),
+    }
+
+
+def percentiles(samples):
+    """Перцентили ``PERCENTILES`` выборки: ``{'p50': …, …}``."""
+    if len(samples) > 1:
+        cuts = statistics.quantiles(samples, n=100, method='inclusive')
+        values = {f'p{p}': cuts[p - 1] for p in PERCENTILES}
+    else:
+        values = {f'p{p}': samples[0] for p in PERCENTILES}
+    return {name: round(value, 3) for name, value in values.items()}
+
+
+def summarize(samples, queries):
+    """Перцентили задержки в миллисекундах и число запросов."""
+    return {
+        **percentiles(samples),
+        'mean': round(statistics.mean(samples), 3),
+        'queries': max(queries),
+        'iterations': len(samples),
+    }
+
+
+def measure(client, request, iterations, cold):
+    samples, queries = [], []
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        # Журнал запросов ограничен 9000 записями: переполненный журнал
+        # CaptureQueriesContext посчитал бы как ноль запросов.
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request(client)
+            samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise BenchmarkError(
+                f'{response.request["PATH_INFO"]}: '
+                f'ответ {response.status_code}')
+        queries.append(len(captured))
+    return summarize(samples, queries)
+
+
+def run(iterations=20, views=None):
+    """Замеры всех сценариев на текущей базе.
+
+    Возвращает ``{представление: {режим: сводка}}``.
+    """
+    targets = find_targets()
+    client = Client()
+    client.force_login(targets.reader)
+    results = {}
+    for view, request in scenarios(targets).items():
+        if views and view not in views:
+            continue
+        results[view] = {
+            mode: measure(client, request, iterations, mode == 'cold')
+            for mode in MODES
+        }
+    return results
+
+
+def check(results, baseline=None, tolerance=1.5):
+    """Нарушения бюджетов: список сообщений, пустой — всё в норме.
+
+    ``results`` и ``baseline`` — ``{набор: {представление: {режим:
+    сводка}}}``. Без базового замера проверяются только бюджеты
+    запросов.
+    """
+    failures = []
+    baseline = baseline or {}
+    for dataset, views in results.items():
+        for view, modes in views.items():
+            budget = QUERY_BUDGETS.get(view)
+            queries = modes['cold']['queries']
+            if budget is not None and queries > budget:
+                failures.append(
+                    f'{dataset}/{view}: {queries} запросов '
+                    f'при бюджете {budget}')
+            for mode, summary in modes.items():
+                base = baseline.get(dataset, {}).get(view, {}).get(mode)
+                if base is None:
+                    continue
+                name = f'{dataset}/{view}/{mode}'
+                if summary['queries'] > base['queries']:
+                    failures.append(
+                        f'{name}: {summary["queries"]} запросов, '
+                        f'в базовом замере {base["queries"]}')
+                limit = base['p95'] * tolerance + LATENCY_SLACK_MS
+                if summary['p95'] > limit:
+                    failures.append(
+                        f'{name}: p95 {summary["p95"]:.1f} мс, '
+                        f'в базовом замере {base["p95"]:.1f} мс')
+    return failures
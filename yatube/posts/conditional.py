@@ -0,0 +1,78 @@
+"""Валидаторы условных GET-запросов по ETag.
+
+Если у клиента актуальная копия страницы, представление отвечает
+``304 Not Modified``, не выполняя запросов ленты и не рендеря шаблон.
+
+Для лент ETag строится из поколений кэша страниц (см.
+``posts.generations``): они меняются при любом изменении поста, автора
+или группы, в том числе при удалении, которое по дате новейшего поста
+не заметить. Для поста ETag складывается из даты его изменения,
+счётчиков и даты последнего комментария.
+
+Last-Modified не отдаётся: дата последнего комментария уходит назад
+при его удалении, а счётчики поста и автора дат не имеют, так что
+проверка по ``If-Modified-Since`` отдавала бы устаревшие страницы.
+
+Страницы вошедшего пользователя содержат CSRF-токен (форма
+комментария), поэтому в их ETag входит CSRF-кука: после нового входа
+токен меняется, и старая копия страницы с формой уже не подходит.
+"""
+import hashlib
+
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from . import generations
+from .models import Comment, Post
+
+
+def make_etag(request, *parts):
+    """ETag страницы для пользователя запроса и её адреса."""
+    csrf_token = None
+    if request.user.is_authenticated:
+        csrf_token = request.META.get('CSRF_COOKIE')
+    state = ':'.join(map(str, (
+        *parts, request.user.pk, csrf_token, request.get_full_path())))
+    return hashlib.md5(state.encode()).hexdigest()
+
+
+def condition_by_generation(scopes):
+    """``condition``, ETag которого — поколения областей ``scopes``."""
+    def etag(request, *args, **kwargs):
+        return make_etag(
+            request, generations.get_state(scopes(*args, **kwargs)))
+    return condition(etag_func=etag)
+
+
+def post_state(request, post_id):
+    """Данные поста, от которых зависит его страница; ``None`` — нет поста.
+
+    Запоминаются в запросе.
+    """
+    if not hasattr(request, '_post_state'):
+        state = Post.objects.filter(pk=post_id).values(
+            'updated', 'comments_count', 'author__username',
+            'author__stats__posts_count', 'group__slug',
+        ).first()
+        if state is not None:
+            state['last_comment'] = Comment.objects.filter(
+                post_id=post_id).aggregate(last=Max('created'))['last']
+        request._post_state = state
+    return request._post_state
+
+
+def post_etag(request, post_id):
+    state = post_state(request, post_id)
+    if state is None:
+        return None
+    scopes = [generations.profile_scope(state['author__username'])]
+    if state['group__slug']:
+        scopes.append(generations.group_scope(state['group__slug']))
+    return make_etag(
+        request, state['updated'], state['comments_count'],
+        state['author__stats__posts_count'], state['last_comment'],
+        generations.get_state(scopes),
+    )
+
+
+post_condition = condition(etag_func=post_etag)
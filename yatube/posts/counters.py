@@ -0,0 +1,116 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными ``UPDATE ... SET x = x + 1`` из сигналов
+в той же транзакции, что и запись (см. ``ATOMIC_REQUESTS``), а
+``recount_users``/``recount_posts`` пересчитывают их заново пачками.
+Уменьшение не опускает счётчик ниже нуля: разошедшийся с данными
+счётчик иначе нарушил бы ограничение положительного поля.
+"""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+
+
+def _shifted(name, delta):
+    if delta < 0:
+        return Greatest(F(name) + delta, 0)
+    return F(name) + delta
+
+
+def change_user_counters(user_id, **deltas):
+    """Сдвинуть счётчики пользователя, например ``posts_count=1``.
+
+    Если строки счётчиков ещё нет, при увеличении она создаётся
+    пересчётом; при уменьшении отсутствующая строка не создаётся —
+    пользователь может удаляться вместе со своими записями.
+    """
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        name: _shifted(name, delta) for name, delta in deltas.items()
+    })
+    if updated or min(deltas.values()) < 0:
+        return
+    try:
+        with transaction.atomic():
+            recount_users([user_id])
+    except IntegrityError:
+        pass
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shifted('comments_count', delta))
+
+
+def get_user_stats(user):
+    """Счётчики пользователя; отсутствующие пересчитываются."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        recount_users([user.pk])
+        return UserStats.objects.get(user_id=user.pk)
+
+
+def _counts(model, field, ids):
+    rows = model.objects.filter(**{f'{field}__in': ids}).order_by().values(
+        field).annotate(total=Count('pk')).values_list(field, 'total')
+    return dict(rows)
+
+
+def recount_users(user_ids):
+    """Пересчитать счётчики пользователей из списка ``user_ids``."""
+    user_ids = list(User.objects.filter(pk__in=user_ids).values_list(
+        'pk', flat=True))
+    counts = {
+        name: _counts(model, field, user_ids)
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+    stats = [
+        UserStats(user_id=user_id, **{
+            name: counts[name].get(user_id, 0) for name in USER_COUNTERS
+        })
+        for user_id in user_ids
+    ]
+    existing = set(UserStats.objects.filter(
+        user_id__in=user_ids).values_list('user_id', flat=True))
+    UserStats.objects.bulk_update(
+        [item for item in stats if item.user_id in existing],
+        list(USER_COUNTERS),
+    )
+    UserStats.objects.bulk_create(
+        [item for item in stats if item.user_id not in existing])
+    return len(stats)
+
+
+def recount_posts(post_ids):
+    """Пересчитать число комментариев постов из списка ``post_ids``."""
+    post_ids = list(post_ids)
+    counts = _counts(Comment, 'post_id', post_ids)
+    posts = [
+        Post(pk=post_id, comments_count=counts.get(post_id, 0))
+        for post_id in post_ids
+    ]
+    Post.objects.bulk_update(posts, ['comments_count'])
+    return len(posts)
+
+
+def iter_batches(queryset, batch_size):
+    """Первичные ключи ``queryset`` пачками по ``batch_size``."""
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by(
+            'pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
@@ -0,0 +1,125 @@
+"""Потоковая выгрузка постов, комментариев и подписок.
+
+Строки читаются пачками по первичному ключу (``WHERE id > последний``),
+поэтому в памяти одновременно только одна пачка, а каждый запрос идёт
+по индексу, как бы велика ни была таблица. Выгрузка — генератор
+кусков текста или байтов: его можно писать в файл или отдавать в
+``StreamingHttpResponse``.
+
+Формат постов совпадает с тем, что читает команда ``import_posts``.
+"""
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Follow, Post
+
+FORMATS = ('jsonl', 'csv')
+CHUNK_SIZE = 2000
+
+# Набор: модель и выгружаемые поля — имя колонки и путь для values().
+DATASETS = {
+    'posts': (Post, {
+        'id': 'id',
+        'text': 'text',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'pub_date': 'pub_date',
+        'updated': 'updated',
+        'comments_count': 'comments_count',
+    }),
+    'comments': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follows': (Follow, {
+        'id': 'id',
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def iter_rows(dataset, queryset=None, chunk_size=CHUNK_SIZE):
+    """Строки набора ``dataset`` словарями, пачками по ``chunk_size``."""
+    model, columns = DATASETS[dataset]
+    if queryset is None:
+        queryset = model.objects.all()
+    queryset = queryset.order_by('pk').values(*columns.values())
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(pk__gt=last)
+        chunk = list(chunk[:chunk_size])
+        for row in chunk:
+            yield {column: row[path] for column, path in columns.items()}
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]['id']
+
+
+class _Line:
+    """Файл для ``csv.writer``, который просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def serialize(dataset, rows, fmt):
+    """Текст выгрузки по строке на запись: JSON Lines или CSV."""
+    if fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(
+                row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        return
+    columns = DATASETS[dataset][1]
+    writer = csv.DictWriter(_Line(), fieldnames=list(columns))
+    yield writer.writerow(dict(zip(columns, columns)))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def encode(chunks, compress=False, buffer_size=64 * 1024):
+    """Байты выгрузки, при ``compress`` — поток gzip.
+
+    Мелкие строки собираются в куски по ``buffer_size``, чтобы не
+    отдавать клиенту и не писать в файл по строке за раз.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer, size = [], 0
+    for chunk in chunks:
+        data = chunk.encode()
+        buffer.append(data)
+        size += len(data)
+        if size < buffer_size:
+            continue
+        data, buffer, size = b''.join(buffer), [], 0
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    data = b''.join(buffer)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def export(dataset, fmt, compress=False, queryset=None,
+           chunk_size=CHUNK_SIZE):
+    """Выгрузка набора ``dataset`` кусками байтов."""
+    rows = iter_rows(dataset, queryset, chunk_size)
+    return encode(serialize(dataset, rows, fmt), compress)
+
+
+def filename(dataset, fmt, compress=False):
+    return f'{dataset}.{fmt}' + ('.gz' if compress else '')
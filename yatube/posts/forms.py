@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from .images import ingest
 from .models import Post, Comment
 
 
@@ -12,6 +15,15 @@ class PostForm(forms.ModelForm):
             'group': 'Группа, к которой будет относиться пост'
         }
 
+    image_report = None
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # Без новой загрузки здесь уже сохранённый файл поста.
+        if isinstance(image, UploadedFile):
+            image, self.image_report = ingest(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
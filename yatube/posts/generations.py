@@ -0,0 +1,117 @@
+"""Поколения кэша страниц.
+
+У каждой области (главная, группа, профиль) есть номер поколения в
+кэше, который входит в ключ закэшированной страницы. Изменение поста,
+автора или группы увеличивает номер, и старые страницы перестают
+находиться: их можно хранить долго, не боясь устаревания.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.cache import cache_page
+
+INDEX = 'index'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def author_scope(author_id):
+    """Данные автора в карточках постов: имя и адрес профиля."""
+    return f'author:{author_id}'
+
+
+def group_card_scope(group_id):
+    """Данные группы в карточках постов: название и адрес."""
+    return f'group-card:{group_id}'
+
+
+def index_scopes():
+    return [INDEX]
+
+
+def group_scopes(slug):
+    return [group_scope(slug)]
+
+
+def profile_scopes(username):
+    return [profile_scope(username)]
+
+
+def _key(scope):
+    return f'posts:generation:{scope}'
+
+
+def _initial():
+    # После вытеснения ключа поколение не должно совпасть с прежним.
+    return int(time.time() * 1000000)
+
+
+def get_generations(scopes):
+    """Текущие номера поколений областей ``scopes``."""
+    keys = {_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    generations = {keys[key]: value for key, value in found.items()}
+    for key, scope in keys.items():
+        if scope not in generations:
+            cache.add(key, _initial(), None)
+            generations[scope] = cache.get(key)
+    return generations
+
+
+def get_state(scopes):
+    """Хэш текущих поколений областей ``scopes``."""
+    generations = get_generations(scopes)
+    state = ':'.join(f'{scope}.{generations[scope]}' for scope in scopes)
+    return hashlib.md5(state.encode()).hexdigest()
+
+
+def bump(*scopes):
+    """Сделать закэшированные страницы областей ``scopes`` устаревшими."""
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            cache.set(_key(scope), _initial(), None)
+
+
+def bump_on_commit(*scopes):
+    """Сбросить поколения сейчас и ещё раз после фиксации транзакции.
+
+    Повторный сброс не даёт параллельному запросу закэшировать
+    страницу с данными, прочитанными до фиксации.
+    """
+    bump(*scopes)
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def cache_page_by_generation(scopes, timeout=None):
+    """``cache_page``, ключ которого включает поколения областей.
+
+    ``scopes`` — функция от аргументов представления, возвращающая
+    список областей страницы. В ключ входит и пользователь: шапка,
+    кнопка подписки и ссылки автора у каждого свои, а ``Vary: Cookie``
+    сессия добавляет уже после того, как ``cache_page`` сохранил ответ.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key_prefix = '{}.{}.{}'.format(
+                view.__name__, request.user.pk or 'anonymous',
+                get_state(scopes(*args, **kwargs)))
+            cached_view = cache_page(
+                settings.FEED_CACHE_TIMEOUT if timeout is None else timeout,
+                key_prefix=key_prefix,
+            )(view)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,137 @@
+"""Приём картинок постов.
+
+Загруженная картинка проверяется по размеру файла и числу пикселей ещё
+до декодирования (по заголовку), затем уменьшается до
+``POST_IMAGE_MAX_SIDE`` по большей стороне и перекодируется: JPEG для
+непрозрачных картинок, PNG для картинок с прозрачностью. При
+перекодировании пропадают EXIF, ICC-профили и прочие метаданные.
+Анимированные картинки перекодируются покадрово в GIF с прежними
+длительностями кадров; лимит пикселей для них считается по всем
+кадрам. Картинка, которую не удаётся декодировать (например,
+обрезанный JPEG), отклоняется ошибкой формы.
+"""
+import logging
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps, ImageSequence
+
+logger = logging.getLogger(__name__)
+
+IngestReport = namedtuple('IngestReport', 'original_size stored_size')
+
+FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'PNG': ('.png', 'image/png'),
+    'GIF': ('.gif', 'image/gif'),
+}
+# Длительность кадра анимации без своей длительности, мс.
+DEFAULT_FRAME_DURATION = 100
+
+
+def check_limits(upload, image):
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл картинки больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)},
+        )
+    width, height = image.size
+    frames = getattr(image, 'n_frames', 1)
+    if width * height * frames > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'В картинке больше %(limit)s пикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS},
+        )
+
+
+def encode(image):
+    """Перекодировать картинку; возвращает байты и формат."""
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+    output = BytesIO()
+    if has_alpha:
+        image.convert('RGBA').save(output, 'PNG', optimize=True)
+        return output.getvalue(), 'PNG'
+    image.convert('RGB').save(
+        output, 'JPEG',
+        quality=settings.POST_IMAGE_JPEG_QUALITY,
+        optimize=True,
+        progressive=True,
+    )
+    return output.getvalue(), 'JPEG'
+
+
+def encode_animation(image, max_side):
+    """Перекодировать анимацию покадрово в GIF; байты и формат."""
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', DEFAULT_FRAME_DURATION))
+        frame = frame.convert('RGBA')
+        # Метаданные кадра (комментарии, XMP) в новый файл не переносятся.
+        frame.info = {}
+        frame.thumbnail((max_side, max_side), Image.LANCZOS)
+        frames.append(frame)
+    output = BytesIO()
+    frames[0].save(
+        output, 'GIF',
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        loop=image.info.get('loop', 0),
+        disposal=2,
+        optimize=True,
+    )
+    return output.getvalue(), 'GIF'
+
+
+def decode_and_encode(image):
+    """Уменьшить и перекодировать картинку; байты и формат."""
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    if getattr(image, 'is_animated', False):
+        return encode_animation(image, max_side)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return encode(image)
+
+
+def ingest(upload):
+    """Проверить и перекодировать загруженную картинку.
+
+    Возвращает файл для сохранения в модели и ``IngestReport``.
+    """
+    upload.seek(0)
+    try:
+        # Открытие читает только заголовок: пиксели ещё не декодированы.
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'В картинке больше %(limit)s пикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS},
+        )
+    except (OSError, ValueError):
+        raise ValidationError(
+            'Не удалось прочитать картинку.', code='invalid_image')
+    check_limits(upload, image)
+    try:
+        content, image_format = decode_and_encode(image)
+    except (OSError, ValueError) as error:
+        logger.info('Картинка %s не декодируется: %s', upload.name, error)
+        raise ValidationError(
+            'Файл картинки повреждён или обрезан.', code='invalid_image')
+    extension, content_type = FORMATS[image_format]
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    report = IngestReport(upload.size, len(content))
+    logger.info(
+        'Картинка %s: %s байт, после перекодирования %s байт (%+d)',
+        upload.name, report.original_size, report.stored_size,
+        report.stored_size - report.original_size,
+    )
+    return SimpleUploadedFile(name, content, content_type), report
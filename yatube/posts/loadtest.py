@@ -0,0 +1,377 @@
+"""Нагрузочный прогон WSGI-приложения в том же процессе.
+
+Каждый поток — виртуальный пользователь со своими куками: он вызывает
+``yatube.wsgi.application`` напрямую, как это делал бы WSGI-сервер,
+и выбирает действия по весам сценария ``SCENARIO``. Анонимные
+пользователи только читают; вошедшие ещё читают ленту подписок,
+комментируют, подписываются и публикуют посты.
+
+Ошибки делятся на виды: ответы 4xx и 5xx, а среди исключений
+приложения отдельно считаются блокировки SQLite (``database is
+locked``) — главный признак того, что база не справляется с
+параллельной записью.
+
+Прогон пишет в базу, поэтому ``database_copy`` подменяет её на время
+прогона временной копией. Потоки делят один процесс и GIL: Python-код
+представлений выполняется по очереди, и пропускная способность ниже,
+а очереди к SQLite короче, чем у нескольких процессов WSGI-сервера.
+Цифры прогона годятся для сравнения версий между собой, а не как
+оценка боевой нагрузки.
+"""
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from io import BytesIO
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import got_request_exception
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.urls import reverse
+
+from .benchmarks import percentiles
+from .models import Group, Post
+
+User = get_user_model()
+
+# Верхние границы корзин гистограммы задержки, мс.
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+TARGETS_LIMIT = 1000
+
+Action = namedtuple('Action', 'weight login_required request')
+Targets = namedtuple('Targets', 'usernames slugs post_ids readers')
+
+
+def _pick(rng, values):
+    return rng.choice(values)
+
+
+SCENARIO = {
+    'index': Action(30, False, lambda rng, t: (
+        'GET', reverse('posts:index'), None)),
+    'group': Action(15, False, lambda rng, t: (
+        'GET', reverse('posts:group_list', args=[_pick(rng, t.slugs)]),
+        None)),
+    'profile': Action(15, False, lambda rng, t: (
+        'GET', reverse('posts:profile', args=[_pick(rng, t.usernames)]),
+        None)),
+    'post': Action(20, False, lambda rng, t: (
+        'GET', reverse('posts:post_detail', args=[_pick(rng, t.post_ids)]),
+        None)),
+    'search': Action(5, False, lambda rng, t: (
+        'GET', reverse('posts:search') + '?' + urlencode(
+            {'q': rng.choice(('пост', 'группа', 'текст', 'день'))}),
+        None)),
+    'feed': Action(15, True, lambda rng, t: (
+        'GET', reverse('posts:follow_index'), None)),
+    'comment': Action(5, True, lambda rng, t: (
+        'POST', reverse('posts:add_comment', args=[_pick(rng, t.post_ids)]),
+        {'text': 'Комментарий нагрузочного теста'})),
+    'follow': Action(3, True, lambda rng, t: (
+        'GET',
+        reverse('posts:profile_follow', args=[_pick(rng, t.usernames)]),
+        None)),
+    'create': Action(2, True, lambda rng, t: (
+        'POST', reverse('posts:post_create'),
+        {'text': 'Пост нагрузочного теста', 'group': ''})),
+}
+
+_local = threading.local()
+
+
+def _remember_exception(sender, **kwargs):
+    _local.exception = sys.exc_info()[1]
+
+
+def error_kind(status, exception):
+    """Вид ошибки запроса или ``None``, если запрос успешен."""
+    if isinstance(exception, OperationalError) and (
+            'locked' in str(exception)):
+        return 'sqlite_locked'
+    if exception is not None:
+        return 'exception'
+    if status >= 500:
+        return 'server_error'
+    if status >= 400:
+        return 'client_error'
+    return None
+
+
+class WSGIClient:
+    """Браузер виртуального пользователя: куки сессии и CSRF."""
+
+    def __init__(self, application, host=None):
+        self.application = application
+        self.host = host or settings.ALLOWED_HOSTS[0]
+        self.cookies = {}
+
+    def request(self, method, path, data=None):
+        """Выполнить запрос; возвращает код ответа и размер тела."""
+        url = urlsplit(path)
+        body = urlencode(data or {}).encode()
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': self.host,
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if self.cookies:
+            environ['HTTP_COOKIE'] = '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items())
+        if method == 'POST':
+            environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+            environ['CONTENT_LENGTH'] = str(len(body))
+            token = self.cookies.get(settings.CSRF_COOKIE_NAME)
+            if token:
+                environ['HTTP_X_CSRFTOKEN'] = token
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split()[0])
+            response['headers'] = headers
+
+        result = self.application(environ, start_response)
+        try:
+            size = sum(len(chunk) for chunk in result)
+        finally:
+            # close() отправляет request_finished, как настоящий сервер.
+            if hasattr(result, 'close'):
+                result.close()
+        for name, value in response['headers']:
+            if name.lower() == 'set-cookie':
+                self.store_cookies(value)
+        return response['status'], size
+
+    def store_cookies(self, header):
+        for name, morsel in SimpleCookie(header).items():
+            if morsel['max-age'] == '0' or not morsel.value:
+                self.cookies.pop(name, None)
+            else:
+                self.cookies[name] = morsel.value
+
+    def login(self, username, password):
+        path = reverse('users:login')
+        # GET выдаёт куку csrftoken, без неё POST отклоняется.
+        self.request('GET', path)
+        status, _ = self.request(
+            'POST', path, {'username': username, 'password': password})
+        return status == 302 and settings.SESSION_COOKIE_NAME in self.cookies
+
+
+class Stats:
+    """Потокобезопасные счётчики прогона."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.bytes = Counter()
+
+    def record(self, action, elapsed_ms, size, error):
+        with self.lock:
+            self.samples.setdefault(action, []).append(elapsed_ms)
+            self.bytes[action] += size
+            errors = self.errors.setdefault(action, Counter())
+            if error:
+                errors[error] += 1
+
+    def histogram(self, samples):
+        counts = Counter()
+        for sample in samples:
+            for bucket in HISTOGRAM_BUCKETS_MS:
+                if sample <= bucket:
+                    counts[str(bucket)] += 1
+                    break
+            else:
+                counts['+Inf'] += 1
+        return {
+            bucket: counts[bucket]
+            for bucket in [*map(str, HISTOGRAM_BUCKETS_MS), '+Inf']
+        }
+
+    def report(self, elapsed):
+        actions = {}
+        for action, samples in sorted(self.samples.items()):
+            actions[action] = {
+                'requests': len(samples),
+                'errors': dict(self.errors[action]),
+                **percentiles(samples),
+                'mean_bytes': round(self.bytes[action] / len(samples)),
+                'histogram': self.histogram(samples),
+            }
+        total = sum(len(samples) for samples in self.samples.values())
+        errors = sum(
+            (Counter(action['errors']) for action in actions.values()),
+            Counter())
+        return {
+            'seconds': round(elapsed, 3),
+            'requests': total,
+            'throughput': round(total / elapsed, 2) if elapsed else 0,
+            'errors': dict(errors),
+            'error_rate': round(sum(errors.values()) / total, 4)
+            if total else 0,
+            'actions': actions,
+        }
+
+
+def load_targets():
+    """Объекты, к которым обращаются виртуальные пользователи."""
+    post_ids = list(Post.objects.order_by('-pk').values_list(
+        'pk', flat=True)[:TARGETS_LIMIT])
+    usernames = list(User.objects.filter(
+        stats__posts_count__gt=0).order_by('-stats__posts_count').values_list(
+        'username', flat=True)[:TARGETS_LIMIT])
+    slugs = list(Group.objects.values_list('slug', flat=True)[
+        :TARGETS_LIMIT])
+    readers = list(User.objects.order_by(
+        '-stats__following_count', 'pk').values_list(
+        'username', flat=True)[:TARGETS_LIMIT])
+    if not (post_ids and usernames and slugs):
+        raise ValueError('Для прогона нужны посты, авторы и группы: '
+                         'заполните базу командой seed_load')
+    return Targets(usernames, slugs, post_ids, readers)
+
+
+@contextmanager
+def database_copy(alias=DEFAULT_DB_ALIAS):
+    """Подменить базу ``alias`` её временной копией; только для SQLite.
+
+    Соединения всех потоков, открытые внутри блока, пишут в копию;
+    после блока копия удаляется.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        raise ValueError(
+            f'Копировать можно только базу SQLite, а не {connection.vendor}')
+    directory = tempfile.mkdtemp(prefix='loadtest-')
+    path = os.path.join(directory, 'db.sqlite3')
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        connection.connection.backup(target)
+    finally:
+        target.close()
+    original = connection.settings_dict['NAME']
+    connection.close()
+    connection.settings_dict['NAME'] = path
+    try:
+        yield path
+    finally:
+        # Имя восстанавливается до закрытия: SQLite-бэкенд не закрывает
+        # соединение с базой в памяти, иначе она пропала бы.
+        connection.settings_dict['NAME'] = original
+        connection.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class LoadTest:
+    """Прогон: ``workers`` потоков до ``duration`` секунд или
+    ``requests`` запросов — что наступит раньше.
+    """
+
+    def __init__(self, application, targets, password, workers=8,
+                 duration=30, requests=None, logged_in_ratio=0.5, seed=0,
+                 scenario=SCENARIO):
+        self.application = application
+        self.targets = targets
+        self.password = password
+        self.workers = workers
+        self.duration = duration
+        self.requests = requests
+        self.logged_in_ratio = logged_in_ratio
+        self.seed = seed
+        self.scenario = scenario
+        self.stats = Stats()
+        self.lock = threading.Lock()
+        self.started = 0
+
+    def take(self):
+        """Можно ли выполнить ещё один запрос."""
+        if time.monotonic() - self.start_time >= self.duration:
+            return False
+        if self.requests is None:
+            return True
+        with self.lock:
+            if self.started >= self.requests:
+                return False
+            self.started += 1
+            return True
+
+    def perform(self, client, action, method, path, data=None):
+        _local.exception = None
+        started = time.perf_counter()
+        exception, status, size = None, 0, 0
+        try:
+            status, size = client.request(method, path, data)
+        except Exception as error:
+            exception = error
+        elapsed = (time.perf_counter() - started) * 1000
+        exception = exception or _local.exception
+        self.stats.record(
+            action, elapsed, size, error_kind(status, exception))
+
+    def worker(self, number):
+        rng = random.Random(f'{self.seed}:{number}')
+        client = WSGIClient(self.application)
+        logged_in = False
+        try:
+            if self.targets.readers and rng.random() < self.logged_in_ratio:
+                username = rng.choice(self.targets.readers)
+                _local.exception = None
+                started = time.perf_counter()
+                logged_in = client.login(username, self.password)
+                error = error_kind(0, _local.exception)
+                if not (logged_in or error):
+                    error = 'login_failed'
+                self.stats.record(
+                    'login', (time.perf_counter() - started) * 1000, 0,
+                    error)
+            actions = [
+                (name, action) for name, action in self.scenario.items()
+                if logged_in or not action.login_required
+            ]
+            names = [name for name, _ in actions]
+            weights = [action.weight for _, action in actions]
+            while self.take():
+                name = rng.choices(names, weights)[0]
+                method, path, data = self.scenario[name].request(
+                    rng, self.targets)
+                self.perform(client, name, method, path, data)
+        finally:
+            connections.close_all()
+
+    def run(self):
+        got_request_exception.connect(_remember_exception)
+        self.start_time = time.monotonic()
+        threads = [
+            threading.Thread(target=self.worker, args=(number,))
+            for number in range(self.workers)
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            got_request_exception.disconnect(_remember_exception)
+        return self.stats.report(time.monotonic() - self.start_time)
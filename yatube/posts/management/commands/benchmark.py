@@ -0,0 +1,129 @@
+import json
+import os
+import platform
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment
+)
+from django.utils import timezone
+
+from posts import benchmarks
+
+BENCHMARK_DIR = os.path.join(settings.BASE_DIR, 'benchmarks')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и число запросов представлений на '
+            'синтетических данных и сверяет их с бюджетами')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'datasets', nargs='*',
+            help=('Наборы данных: '
+                  f'{", ".join(benchmarks.DATASETS)} (по умолчанию small)')
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=20,
+            help='Сколько раз повторять каждый запрос'
+        )
+        parser.add_argument(
+            '--view', action='append', dest='views',
+            help='Замерить только это представление (можно повторять)'
+        )
+        parser.add_argument(
+            '--output', default=os.path.join(BENCHMARK_DIR, 'results.json'),
+            help='Куда записать результаты'
+        )
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(BENCHMARK_DIR, 'baseline.json'),
+            help='Базовый замер для сравнения'
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Сохранить результаты как новый базовый замер'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=1.5,
+            help='Во сколько раз p95 может превысить базовый замер'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0, help='Зерно для seed_load')
+
+    def handle(self, *args, **options):
+        datasets = options['datasets'] or ['small']
+        unknown = set(datasets) - benchmarks.DATASETS.keys()
+        if unknown:
+            raise CommandError(
+                f'Неизвестные наборы: {", ".join(sorted(unknown))}')
+        results = {}
+        setup_test_environment()
+        try:
+            for dataset in datasets:
+                results[dataset] = self.run_dataset(dataset, options)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        self.write(options['output'], report)
+        if options['save_baseline']:
+            self.write(options['baseline'], report)
+            return
+        baseline = None
+        if os.path.exists(options['baseline']):
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+        failures = benchmarks.check(
+            results, baseline, options['tolerance'])
+        if failures:
+            raise CommandError(
+                'Бюджеты превышены:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Бюджеты соблюдены'))
+
+    def run_dataset(self, dataset, options):
+        # Каждый набор — в отдельной тестовой базе: рабочая база
+        # не затрагивается, а размеры наборов не смешиваются.
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f'Набор {dataset}: заполнение…')
+            call_command(
+                'seed_load', seed=options['seed'], stdout=StringIO(),
+                **benchmarks.DATASETS[dataset])
+            results = benchmarks.run(
+                options['iterations'], options['views'])
+        except benchmarks.BenchmarkError as error:
+            raise CommandError(error)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.print_table(dataset, results)
+        return results
+
+    def print_table(self, dataset, results):
+        self.stdout.write(
+            f'{dataset:<8} {"представление":<14} {"режим":<5} '
+            f'{"p50":>8} {"p95":>8} {"p99":>8} {"запросы":>8}')
+        for view, modes in results.items():
+            for mode, summary in modes.items():
+                self.stdout.write(
+                    f'{"":<8} {view:<14} {mode:<5} '
+                    f'{summary["p50"]:>8.1f} {summary["p95"]:>8.1f} '
+                    f'{summary["p99"]:>8.1f} {summary["queries"]:>8}')
+
+    def write(self, path, report):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {path}')
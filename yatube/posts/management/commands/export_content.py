@@ -0,0 +1,59 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from posts.export import CHUNK_SIZE, DATASETS, FORMATS, export, filename
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты, комментарии и подписки в JSONL или CSV '
+            'потоком, не загружая таблицы в память')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'datasets', nargs='*',
+            help=f'Что выгружать: {", ".join(DATASETS)} (по умолчанию всё)'
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS, default='jsonl',
+            help='Формат файлов'
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжимать файлы gzip')
+        parser.add_argument(
+            '--output-dir', default='.',
+            help='Каталог для файлов выгрузки'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Сколько строк читать из базы за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        fmt, compress = options['format'], options['gzip']
+        datasets = options['datasets'] or list(DATASETS)
+        unknown = set(datasets) - DATASETS.keys()
+        if unknown:
+            raise CommandError(
+                f'Неизвестные наборы: {", ".join(sorted(unknown))}')
+        os.makedirs(options['output_dir'], exist_ok=True)
+        for dataset in datasets:
+            path = os.path.join(
+                options['output_dir'], filename(dataset, fmt, compress))
+            started = time.monotonic()
+            # Пишем во временный файл: прерванная выгрузка не оставит
+            # обрезанный файл под настоящим именем.
+            temporary = path + '.tmp'
+            with open(temporary, 'wb') as file:
+                for data in export(
+                        dataset, fmt, compress,
+                        chunk_size=options['chunk_size']):
+                    file.write(data)
+            os.replace(temporary, path)
+            self.stdout.write(
+                f'{dataset}: {path}, '
+                f'{filesizeformat(os.path.getsize(path))} '
+                f'за {time.monotonic() - started:.1f} с'
+            )
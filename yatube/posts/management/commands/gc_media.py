@@ -0,0 +1,130 @@
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from sorl.thumbnail import delete as delete_image
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from posts.models import MediaFile, Post
+from posts.storage import post_image_storage
+from posts.thumbnails import known_thumbnails, stored_thumbnails
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки, на которые не ссылается ни один пост и '
+            'ни один счётчик ссылок, и миниатюры, о которых не знает sorl')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько файлов проверять одним запросом'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: они могут '
+                 'принадлежать ещё не зафиксированным постам'
+        )
+
+    def walk(self, directory):
+        """Файлы каталога хранилища по одному, без полного списка."""
+        root = post_image_storage.path('')
+        deadline = time.time() - self.min_age
+        top = os.path.join(root, directory)
+        for path, dirnames, filenames in os.walk(top):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                full_path = os.path.join(path, filename)
+                try:
+                    stat = os.stat(full_path)
+                except FileNotFoundError:
+                    # Файл удалили во время обхода: параллельный gc
+                    # или удаление поста.
+                    continue
+                if stat.st_mtime <= deadline:
+                    name = os.path.relpath(full_path, root)
+                    yield name.replace(os.sep, '/'), stat.st_size
+
+    def unregister(self, name):
+        """Снять учёт файла без ссылок; False, если ссылка появилась.
+
+        Ссылки перепроверяются прямо перед удалением: за время обхода
+        файл мог снова понадобиться новому посту.
+        """
+        with transaction.atomic():
+            if Post.objects.filter(image=name).exists():
+                return False
+            if MediaFile.objects.filter(
+                    name=name, references__gt=0).exists():
+                return False
+            MediaFile.objects.filter(name=name).delete()
+        return True
+
+    def collect_images(self):
+        """Картинки постов без ссылок вместе с их миниатюрами."""
+        upload_to = Post._meta.get_field('image').upload_to
+        for batch in batches(self.walk(upload_to), self.batch_size):
+            sizes = dict(batch)
+            referenced = set(Post.objects.filter(
+                image__in=sizes).values_list('image', flat=True))
+            referenced.update(MediaFile.objects.filter(
+                name__in=sizes, references__gt=0
+            ).values_list('name', flat=True))
+            for name in sizes:
+                if name in referenced:
+                    continue
+                if not self.dry_run and not self.unregister(name):
+                    continue
+                self.files += 1
+                self.reclaimed += sizes[name]
+                for thumbnail in stored_thumbnails(name):
+                    if thumbnail.exists():
+                        self.files += 1
+                        self.reclaimed += thumbnail.storage.size(
+                            thumbnail.name)
+                if self.dry_run:
+                    self.stdout.write(f'Картинка без ссылок: {name}')
+                else:
+                    delete_image(name)
+
+    def collect_thumbnails(self):
+        """Миниатюры, которых нет в хранилище ключей sorl."""
+        prefix = thumbnail_settings.THUMBNAIL_PREFIX
+        for batch in batches(self.walk(prefix), self.batch_size):
+            known = known_thumbnails(name for name, _ in batch)
+            for name, size in batch:
+                if name in known:
+                    continue
+                self.files += 1
+                self.reclaimed += size
+                if self.dry_run:
+                    self.stdout.write(f'Лишняя миниатюра: {name}')
+                else:
+                    post_image_storage.delete(name)
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.min_age = options['min_age']
+        self.files = self.reclaimed = 0
+        self.collect_images()
+        self.collect_thumbnails()
+        verb = 'Можно удалить' if self.dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {self.files}, '
+            f'освобождено: {filesizeformat(self.reclaimed)}'))
@@ -0,0 +1,241 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import counters, generations, timelines
+from posts.models import Group, Post
+from posts.utils import preserved_dates
+
+User = get_user_model()
+
+FORMATS = ('jsonl', 'csv')
+
+
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты из JSONL или CSV пачками через bulk_create; '
+            'прерванную загрузку можно продолжить с контрольной точки')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с постами; «-» — стандартный ввод')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла (по умолчанию по расширению)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов вставлять в одной транзакции'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки (по умолчанию <path>.checkpoint)'
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных авторов и группы'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.')
+        if fmt not in FORMATS:
+            raise CommandError(
+                f'Неизвестный формат {fmt!r}, укажите --format')
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным')
+        self.create_missing = options['create_missing']
+        self.authors = {}
+        self.groups = {}
+        self.errors = 0
+        checkpoint = options['checkpoint']
+        if checkpoint is None and path != '-':
+            checkpoint = path + '.checkpoint'
+        done = self.read_checkpoint(checkpoint, path)
+        if done:
+            self.stdout.write(f'Продолжаем с записи {done + 1}')
+
+        stream = sys.stdin if path == '-' else open(
+            path, encoding='utf-8', newline='')
+        started = time.monotonic()
+        imported = 0
+        try:
+            rows = islice(self.read_rows(stream, fmt), done, None)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                imported += self.import_batch(batch)
+                done += len(batch)
+                self.write_checkpoint(checkpoint, path, done)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Записей: {done}, загружено постов: {imported}, '
+                    f'{imported / elapsed:.0f} постов/с')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {imported} за {elapsed:.1f} с '
+            f'({imported / elapsed if elapsed else 0:.0f} постов/с), '
+            f'ошибок: {self.errors}'))
+
+    def read_rows(self, stream, fmt):
+        """Записи файла по одной: ``(номер, словарь)`` или ошибка."""
+        if fmt == 'csv':
+            # Без strict незакрытая кавычка молча склеивает записи.
+            reader = csv.DictReader(stream, strict=True)
+            number = line = 0
+            try:
+                for number, row in enumerate(reader, 1):
+                    line = reader.line_num
+                    yield number, row
+            except csv.Error as error:
+                raise CommandError(
+                    f'Запись {number + 1} (строка {line + 1}): '
+                    f'неверный CSV: {error}')
+            return
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                yield number, RowError('пустая строка')
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as error:
+                yield number, RowError(f'неверный JSON: {error}')
+
+    def read_checkpoint(self, checkpoint, path):
+        if not checkpoint or not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint, encoding='utf-8') as file:
+            state = json.load(file)
+        if state.get('path') != os.path.abspath(path):
+            raise CommandError(
+                f'Контрольная точка {checkpoint} от другого файла')
+        return state['rows']
+
+    def write_checkpoint(self, checkpoint, path, rows):
+        if not checkpoint:
+            return
+        temporary = checkpoint + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump({'path': os.path.abspath(path), 'rows': rows}, file)
+        os.replace(temporary, checkpoint)
+
+    def resolve(self, cache, model, field, values, create):
+        """Первичные ключи объектов по ``field``; кэш на всю загрузку."""
+        missing = {value for value in values if value not in cache}
+        if not missing:
+            return
+        cache.update(model.objects.filter(
+            **{f'{field}__in': missing}).values_list(field, 'pk'))
+        for value in missing - cache.keys():
+            cache[value] = create(value).pk if self.create_missing else None
+
+    def field(self, row, name):
+        value = row.get(name)
+        if value is None:
+            return ''
+        if not isinstance(value, str):
+            raise RowError(f'поле {name} должно быть строкой')
+        return value.strip()
+
+    def parse(self, row):
+        if isinstance(row, Exception):
+            raise row
+        if not isinstance(row, dict):
+            raise RowError('запись должна быть объектом')
+        text = self.field(row, 'text')
+        author = self.field(row, 'author')
+        if not text or not author:
+            raise RowError('нужны поля text и author')
+        pub_date = timezone.now()
+        raw_date = self.field(row, 'pub_date')
+        if raw_date:
+            try:
+                pub_date = parse_datetime(raw_date)
+            except ValueError:
+                pub_date = None
+            if pub_date is None:
+                raise RowError(f'неверная дата {raw_date!r}')
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        return text, author, self.field(row, 'group'), pub_date
+
+    def import_batch(self, batch):
+        parsed = []
+        for number, row in batch:
+            try:
+                parsed.append((number, *self.parse(row)))
+            except RowError as error:
+                self.errors += 1
+                self.stderr.write(f'Запись {number}: {error}')
+        self.resolve(
+            self.authors, User, 'username',
+            {author for _, _, author, _, _ in parsed},
+            lambda username: User.objects.create_user(username=username))
+        self.resolve(
+            self.groups, Group, 'slug',
+            {group for _, _, _, group, _ in parsed if group},
+            lambda slug: Group.objects.create(title=slug, slug=slug))
+        posts = []
+        for number, text, author, group, pub_date in parsed:
+            if self.authors[author] is None:
+                self.errors += 1
+                self.stderr.write(
+                    f'Запись {number}: неизвестный автор {author!r}')
+                continue
+            if group and self.groups[group] is None:
+                self.errors += 1
+                self.stderr.write(
+                    f'Запись {number}: неизвестная группа {group!r}')
+                continue
+            posts.append(Post(
+                text=text,
+                author_id=self.authors[author],
+                group_id=self.groups[group] if group else None,
+                pub_date=pub_date,
+                updated=pub_date,
+            ))
+        if not posts:
+            return 0
+        with transaction.atomic(), preserved_dates(
+                Post, 'pub_date', 'updated'):
+            last_id = Post.objects.order_by('-id').values_list(
+                'id', flat=True).first() or 0
+            Post.objects.bulk_create(posts)
+            # bulk_create обходит сигналы: счётчики и ленты обновляются
+            # здесь одной пачкой.
+            per_author = Counter(post.author_id for post in posts)
+            for author_id, count in per_author.items():
+                counters.change_user_counters(author_id, posts_count=count)
+            timelines.fan_out_many(Post.objects.filter(
+                id__gt=last_id, author_id__in=per_author
+            ).values_list('id', 'author_id', 'pub_date'))
+            self.invalidate(per_author, {post.group_id for post in posts})
+        return len(posts)
+
+    def invalidate(self, author_ids, group_ids):
+        usernames = User.objects.filter(pk__in=author_ids).values_list(
+            'username', flat=True)
+        slugs = Group.objects.filter(pk__in=group_ids).values_list(
+            'slug', flat=True)
+        generations.bump_on_commit(
+            generations.INDEX,
+            *(generations.profile_scope(name) for name in usernames),
+            *(generations.group_scope(slug) for slug in slugs),
+        )
@@ -0,0 +1,106 @@
+import json
+import os
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import loadtest
+from posts.management.commands.seed_load import PASSWORD
+
+
+class Command(BaseCommand):
+    help = ('Нагружает WSGI-приложение смешанным трафиком из нескольких '
+            'потоков в том же процессе. Прогон пишет в базу (комментарии, '
+            'посты, подписки), поэтому по умолчанию идёт на временной '
+            'копии базы SQLite. Потоки делят GIL: результат занижает '
+            'то, что выдержат несколько процессов WSGI-сервера')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Число параллельных виртуальных пользователей'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Длительность прогона, секунд'
+        )
+        parser.add_argument(
+            '--requests', type=int,
+            help='Остановиться после стольких запросов'
+        )
+        parser.add_argument(
+            '--logged-in-ratio', type=float, default=0.5,
+            help='Доля виртуальных пользователей, которые входят в систему'
+        )
+        parser.add_argument(
+            '--password', default=PASSWORD,
+            help='Пароль пользователей (по умолчанию пароль seed_load)'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0, help='Зерно выбора действий')
+        parser.add_argument(
+            '--output', help='Записать отчёт в JSON-файл')
+        parser.add_argument(
+            '--allow-live', action='store_true',
+            help='Писать в настроенную базу, а не во временную копию'
+        )
+
+    def handle(self, *args, **options):
+        # Импорт здесь: модуль создаёт приложение при импорте.
+        from yatube.wsgi import application
+
+        with ExitStack() as stack:
+            if not options['allow_live']:
+                try:
+                    stack.enter_context(loadtest.database_copy())
+                except ValueError as error:
+                    raise CommandError(
+                        f'{error}; для прогона на самой базе '
+                        'укажите --allow-live')
+            try:
+                targets = loadtest.load_targets()
+            except ValueError as error:
+                raise CommandError(error)
+            report = loadtest.LoadTest(
+                application, targets, options['password'],
+                workers=options['workers'],
+                duration=options['duration'],
+                requests=options['requests'],
+                logged_in_ratio=options['logged_in_ratio'],
+                seed=options['seed'],
+            ).run()
+        self.print_report(report)
+        if options['output']:
+            os.makedirs(
+                os.path.dirname(options['output']) or '.', exist_ok=True)
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{report["requests"]} запросов за {report["seconds"]:.1f} с: '
+            f'{report["throughput"]:.1f} в секунду, '
+            f'ошибок {report["error_rate"]:.2%}')
+        self.stdout.write(
+            f'{"действие":<10} {"запросы":>8} {"ошибки":>7} '
+            f'{"p50":>8} {"p95":>8} {"p99":>8}')
+        for name, action in report['actions'].items():
+            self.stdout.write(
+                f'{name:<10} {action["requests"]:>8} '
+                f'{sum(action["errors"].values()):>7} '
+                f'{action["p50"]:>8.1f} {action["p95"]:>8.1f} '
+                f'{action["p99"]:>8.1f}')
+        buckets = list(loadtest.HISTOGRAM_BUCKETS_MS) + ['+Inf']
+        self.stdout.write('Гистограмма задержки, мс: ' + ' '.join(
+            f'{bucket:>6}' for bucket in buckets))
+        for name, action in report['actions'].items():
+            self.stdout.write(f'{name:<26}' + ' '.join(
+                f'{count:>6}' for count in action['histogram'].values()))
+        if report['errors']:
+            self.stdout.write(self.style.WARNING('Ошибки: ' + ', '.join(
+                f'{kind} — {count}'
+                for kind, count in sorted(report['errors'].items()))))
+        locked = report['errors'].get('sqlite_locked', 0)
+        if locked:
+            self.stdout.write(self.style.WARNING(
+                f'Блокировок SQLite: {locked}'))
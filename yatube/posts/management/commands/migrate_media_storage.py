@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.storage import is_hashed_name, post_image_storage
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в хранилище с именами по '
+            'содержимому и переписывает пути в Post.image')
+
+    def handle(self, *args, **options):
+        moved = missing = 0
+        posts = Post.objects.exclude(image='').order_by('pk')
+        for post in posts.iterator():
+            old_name = post.image.name
+            if is_hashed_name(old_name):
+                continue
+            if not post_image_storage.exists(old_name):
+                self.stderr.write(f'Нет файла {old_name} поста {post.pk}')
+                missing += 1
+                continue
+            with post_image_storage.open(old_name) as content:
+                new_name = post_image_storage.save(old_name, content)
+            with transaction.atomic():
+                post.image.name = new_name
+                # Сигналы переносят ссылку на новый файл, и старый файл
+                # удаляется после фиксации.
+                post.save(update_fields=['image', 'updated'])
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено картинок: {moved}, не найдено файлов: {missing}'))
@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры уже загруженных картинок постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=max(settings.POST_THUMBNAIL_WORKERS, 1),
+            help='Сколько картинок обрабатывать параллельно'
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct()
+        workers = options['workers']
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    thumbnails.generate_in_worker, names.iterator()))
+        else:
+            results = [thumbnails.generate(name) for name in names]
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок: {len(results)}, миниатюр построено: {sum(results)}'))
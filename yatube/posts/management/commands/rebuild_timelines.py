@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import timelines
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пользователи, чьи ленты нужно пересобрать (по умолчанию все)'
+        )
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Только разложить посты авторов, ждущих раскладки по лентам'
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            return self.materialize_pending()
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        else:
+            users = User.objects.filter(
+                Q(follower__isnull=False) | Q(timeline__isnull=False)
+            ).distinct()
+        user_ids = users.order_by('id').values_list('id', flat=True)
+        rebuilt = 0
+        for user_id in list(user_ids):
+            timelines.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Пересобрано лент: {rebuilt}'))
+
+    def materialize_pending(self):
+        timelines.sync_modes()
+        authors = timelines.pending_author_ids()
+        inserted = sum(timelines.materialize(pk) for pk in authors)
+        self.stdout.write(self.style.SUCCESS(
+            f'Разложено постов авторов: {len(authors)}, '
+            f'записей лент: {inserted}'
+        ))
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев '
+            'и подписок пачками')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк пересчитывать в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        jobs = (
+            ('пользователей', User.objects.all(), counters.recount_users),
+            ('постов', Post.objects.all(), counters.recount_posts),
+        )
+        for title, queryset, recount in jobs:
+            total = 0
+            for batch in counters.iter_batches(queryset, batch_size):
+                with transaction.atomic():
+                    total += recount(batch)
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересчитано {title}: {total}'))
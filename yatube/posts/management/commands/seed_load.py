@@ -0,0 +1,310 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts import counters, timelines
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import preserved_dates
+
+User = get_user_model()
+
+# Faker медленный для миллионов строк: тексты и имена берутся из пулов.
+POOL_SIZE = 2000
+PASSWORD = 'seed-password'
+MAX_COMMENTS_PER_POST = 1000
+# Пачка авторов для раскладки по лентам: параметры запроса IN (…)
+# не должны упереться в лимит SQLite на 999 переменных.
+TIMELINE_AUTHORS_BATCH = 500
+
+
+def zipf(count, exponent):
+    """Накопленные веса закона Ципфа для ``random.choices``."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками для нагрузочных тестов')
+
+    def add_arguments(self, parser):
+        sizes = (
+            ('users', 1000, 'Число пользователей'),
+            ('groups', 50, 'Число групп'),
+            ('posts', 10000, 'Число постов'),
+            ('comments', 20000, 'Примерное число комментариев'),
+            ('follows', 20000, 'Число попыток подписки (повторы '
+                               'отбрасываются)'),
+        )
+        for name, default, help in sizes:
+            parser.add_argument(
+                f'--{name}', type=int, default=default, help=help)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: одинаковое зерно — одинаковые данные'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк вставлять в одной транзакции'
+        )
+        parser.add_argument(
+            '--follower-skew', type=float, default=1.1,
+            help='Показатель степенного закона числа подписчиков'
+        )
+        parser.add_argument(
+            '--activity-skew', type=float, default=0.8,
+            help='Показатель степенного закона числа постов автора'
+        )
+        parser.add_argument(
+            '--group-skew', type=float, default=1.2,
+            help='Показатель степенного закона популярности групп'
+        )
+        parser.add_argument(
+            '--no-group-ratio', type=float, default=0.2,
+            help='Доля постов без группы'
+        )
+        parser.add_argument(
+            '--skip-timelines', action='store_true',
+            help='Не раскладывать посты по лентам подписок'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        if min(options['groups'], options['posts'], options['comments'],
+               options['follows'], options['days']) < 0:
+            raise CommandError('Размеры не могут быть отрицательными')
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным')
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        faker = Faker('ru_RU')
+        faker.seed_instance(options['seed'])
+        self.faker = faker
+        started = time.monotonic()
+
+        users = self.stage('Пользователи', self.create_users)
+        groups = self.stage('Группы', self.create_groups)
+        # Популярность и активность — независимые случайные ранги:
+        # у первых в списке больше всего подписчиков и постов.
+        self.popular = self.shuffled(users)
+        self.popular_weights = zipf(len(users), options['follower_skew'])
+        self.active = self.shuffled(users)
+        self.active_weights = zipf(len(users), options['activity_skew'])
+        self.hot = self.shuffled(groups)
+        self.hot_weights = zipf(len(groups), options['group_skew'])
+        self.users = users
+        self.groups = groups
+
+        self.stage('Подписки', self.create_follows)
+        self.stage('Посты и комментарии', self.create_posts)
+        self.reset_sequences()
+        self.stage('Счётчики', self.recount)
+        if not options['skip_timelines']:
+            self.stage('Записи лент', self.build_timelines)
+        # Ленты и счётчики изменены в обход сигналов: кэш страниц,
+        # поколений и популярных авторов устарел целиком.
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'))
+
+    def stage(self, title, create):
+        started = time.monotonic()
+        result = create()
+        count = result if isinstance(result, int) else len(result)
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{title}: {count} за {elapsed:.1f} с ({rate:.0f} в секунду)')
+        return result
+
+    def shuffled(self, ids):
+        ids = list(ids)
+        self.random.shuffle(ids)
+        return ids
+
+    def pool(self, make):
+        return [make() for _ in range(POOL_SIZE)]
+
+    def next_ids(self, model, count):
+        """Первичные ключи новых строк: задаём их сами, чтобы ссылаться
+        на строки, не перечитывая их из базы.
+        """
+        last = model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        return range(last + 1, last + 1 + count)
+
+    def insert(self, model, objects, **kwargs):
+        objects = iter(objects)
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                return
+            with transaction.atomic():
+                model.objects.bulk_create(batch, **kwargs)
+
+    def reset_sequences(self):
+        # На SQLite ничего не делает; на других СУБД последовательности
+        # первичных ключей не знают о ключах, заданных вручную.
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Group, Post])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def create_users(self):
+        ids = self.next_ids(User, self.options['users'])
+        names = self.pool(self.faker.user_name)
+        first_names = self.pool(self.faker.first_name)
+        last_names = self.pool(self.faker.last_name)
+        # Хэш пароля считается один раз: он намеренно медленный.
+        password = make_password(PASSWORD)
+        choice = self.random.choice
+
+        def users():
+            for pk in ids:
+                username = f'{choice(names)}_{pk}'
+                yield User(
+                    pk=pk,
+                    username=username,
+                    first_name=choice(first_names),
+                    last_name=choice(last_names),
+                    email=f'{username}@example.com',
+                    password=password,
+                )
+        self.insert(User, users())
+        return ids
+
+    def create_groups(self):
+        ids = self.next_ids(Group, self.options['groups'])
+        self.insert(Group, (
+            Group(
+                pk=pk,
+                title=self.faker.catch_phrase()[:200],
+                slug=f'group-{pk}',
+                description=self.faker.paragraph(),
+            )
+            for pk in ids
+        ))
+        return ids
+
+    def create_follows(self):
+        before = Follow.objects.count()
+        total = self.options['follows']
+        choices = self.random.choices
+
+        def follows():
+            for start in range(0, total, self.batch_size):
+                size = min(self.batch_size, total - start)
+                authors = choices(
+                    self.popular, cum_weights=self.popular_weights, k=size)
+                followers = choices(self.users, k=size)
+                for user_id, author_id in zip(followers, authors):
+                    if user_id != author_id:
+                        yield Follow(user_id=user_id, author_id=author_id)
+        self.insert(Follow, follows(), ignore_conflicts=True)
+        return Follow.objects.count() - before
+
+    def comments_count(self, mean):
+        # Парето с показателем 1.5: у (x - 1) среднее 2 и тяжёлый
+        # хвост — большинство постов без комментариев, немногие с сотнями.
+        count = mean * (self.random.paretovariate(1.5) - 1) / 2
+        return min(int(count + self.random.random()),
+                   MAX_COMMENTS_PER_POST)
+
+    def create_posts(self):
+        options = self.options
+        total = options['posts']
+        ids = self.next_ids(Post, total)
+        texts = self.pool(
+            lambda: self.faker.paragraph(nb_sentences=self.random.randint(
+                1, 6)))
+        comment_texts = self.pool(self.faker.sentence)
+        mean_comments = options['comments'] / total if total else 0
+        now = timezone.now()
+        start = now - timedelta(days=options['days'])
+        span = (now - start).total_seconds()
+        rand, choice, choices = (
+            self.random.random, self.random.choice, self.random.choices)
+        posts, comments = [], []
+        created = 0
+        for number, pk in enumerate(ids):
+            # Даты растут вместе с ключами, как у настоящих постов.
+            pub_date = start + timedelta(
+                seconds=span * (number + rand()) / total)
+            group_id = None
+            if self.groups and rand() >= options['no_group_ratio']:
+                group_id = choices(
+                    self.hot, cum_weights=self.hot_weights)[0]
+            count = self.comments_count(mean_comments)
+            posts.append(Post(
+                pk=pk,
+                text=choice(texts),
+                author_id=choices(
+                    self.active, cum_weights=self.active_weights)[0],
+                group_id=group_id,
+                pub_date=pub_date,
+                updated=pub_date,
+                comments_count=count,
+            ))
+            left = (now - pub_date).total_seconds()
+            comments.extend(
+                Comment(
+                    post_id=pk,
+                    author_id=choice(self.users),
+                    text=choice(comment_texts),
+                    created=pub_date + timedelta(seconds=left * rand()),
+                )
+                for _ in range(count)
+            )
+            if len(posts) + len(comments) >= self.batch_size:
+                created += self.flush(posts, comments)
+                posts, comments = [], []
+        created += self.flush(posts, comments)
+        self.stdout.write(f'Комментариев: {created}')
+        return ids
+
+    def flush(self, posts, comments):
+        with transaction.atomic(), \
+                preserved_dates(Post, 'pub_date', 'updated'), \
+                preserved_dates(Comment, 'created'):
+            Post.objects.bulk_create(posts)
+            Comment.objects.bulk_create(comments)
+        return len(comments)
+
+    def recount(self):
+        users = User.objects.filter(
+            pk__range=(self.users[0], self.users[-1]))
+        total = 0
+        for batch in counters.iter_batches(users, self.batch_size):
+            with transaction.atomic():
+                total += counters.recount_users(batch)
+        return total
+
+    def build_timelines(self):
+        # Популярные авторы определяются по только что пересчитанным
+        # счётчикам подписчиков.
+        cache.delete(timelines.CELEBRITIES_CACHE_KEY)
+        total = 0
+        authors = iter(self.users)
+        while True:
+            batch = list(islice(authors, TIMELINE_AUTHORS_BATCH))
+            if not batch:
+                return total
+            with transaction.atomic():
+                total += timelines.fan_out_authors(batch)
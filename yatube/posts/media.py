@@ -0,0 +1,53 @@
+"""Счётчики ссылок постов на файлы картинок.
+
+Одинаковые картинки хранятся одним файлом (см. ``posts.storage``),
+поэтому файл удаляется, только когда на него не ссылается ни один
+пост: после фиксации транзакции, в которой счётчик дошёл до нуля.
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from sorl.thumbnail import delete as delete_image
+
+from .models import MediaFile, Post
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name):
+    """Учесть ещё одну ссылку на файл ``name``."""
+    updated = MediaFile.objects.filter(name=name).update(
+        references=F('references') + 1)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            MediaFile.objects.create(name=name, references=1)
+    except IntegrityError:
+        MediaFile.objects.filter(name=name).update(
+            references=F('references') + 1)
+
+
+def release(name):
+    """Снять ссылку на файл ``name``; файл без ссылок будет удалён."""
+    MediaFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1)
+    transaction.on_commit(lambda: delete_if_unused(name))
+
+
+def delete_if_unused(name):
+    """Удалить файл ``name``, если на него больше никто не ссылается."""
+    if Post.objects.filter(image=name).exists():
+        return False
+    deleted, _ = MediaFile.objects.filter(name=name, references=0).delete()
+    if not deleted:
+        return False
+    try:
+        # Вместе с файлом удаляются его миниатюры и записи sorl о них.
+        delete_image(name)
+    except (OSError, SuspiciousFileOperation):
+        logger.exception('Не удалось удалить файл %s', name)
+        return False
+    return True
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:04
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def count_references(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    references = Post.objects.exclude(image='').order_by().values(
+        'image').annotate(total=Count('pk')).values_list('image', 'total')
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=name, references=total)
+         for name, total in references.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Путь к файлу')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
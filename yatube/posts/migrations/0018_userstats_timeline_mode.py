@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import migrations, models
+
+FANOUT, MERGED = 0, 1
+
+
+def mark_popular_authors(apps, schema_editor):
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    if threshold is None:
+        return
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(followers_count__gt=threshold).update(
+        timeline_mode=MERGED)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='timeline_mode',
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (0, 'Раскладываются по лентам'),
+                    (1, 'Вливаются при чтении'),
+                    (2, 'Ждут раскладки по лентам'),
+                ],
+                db_index=True,
+                default=0,
+                verbose_name='Посты в лентах подписок',
+            ),
+        ),
+        migrations.RunPython(
+            mark_popular_authors, migrations.RunPython.noop),
+    ]
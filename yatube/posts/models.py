@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import post_image_storage
+
 User = get_user_model()
 TEXT_LEN = 15
 
@@ -17,6 +19,7 @@ class Group(models.Model):
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -32,17 +35,54 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_image_storage,
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:TEXT_LEN]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД нужны, чтобы при сохранении узнать, что изменилось.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Следующее сохранение сравнивается с только что записанным.
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            field.attname: field.get_prep_value(getattr(self, field.attname))
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred
+        }
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -71,6 +111,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -87,5 +133,100 @@ class Follow(models.Model):
         verbose_name='Автор на которого подписались'
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+
     def __str__(self) -> str:
         return f'Пользователь {self.user} подписан на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Владелец ленты'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+
+    def __str__(self) -> str:
+        return f'{self.post} в ленте {self.user}'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+        db_index=True
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+    # Как посты автора попадают в ленты подписок (см. posts.timelines).
+    TIMELINE_FANOUT = 0
+    TIMELINE_MERGED = 1
+    TIMELINE_MATERIALIZING = 2
+    TIMELINE_MODES = (
+        (TIMELINE_FANOUT, 'Раскладываются по лентам'),
+        (TIMELINE_MERGED, 'Вливаются при чтении'),
+        (TIMELINE_MATERIALIZING, 'Ждут раскладки по лентам'),
+    )
+    timeline_mode = models.PositiveSmallIntegerField(
+        'Посты в лентах подписок',
+        choices=TIMELINE_MODES,
+        default=TIMELINE_FANOUT,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self) -> str:
+        return f'Счётчики пользователя {self.user_id}'
+
+
+class MediaFile(models.Model):
+    name = models.CharField('Путь к файлу', max_length=255, primary_key=True)
+    references = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,404 @@
+import base64
+import binascii
+import heapq
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from core.metrics import registry
+
+LAST_PAGE = 'last'
+
+logger = logging.getLogger(__name__)
+
+
+def bounded_count(object_list):
+    """Число записей, но не больше PAGINATOR_EXACT_COUNT_LIMIT.
+
+    Возвращает пару (число, признак приблизительности).
+    """
+    limit = settings.PAGINATOR_EXACT_COUNT_LIMIT
+    if not hasattr(object_list, 'count'):
+        return len(object_list), False
+    # Для подсчёта не нужны ни сортировка, ни вычисляемые поля: bm25()
+    # поиска, например, нельзя вычислять в подзапросе.
+    rows = object_list.order_by().values('pk')
+    count = rows[:limit + 1].count()
+    if count > limit:
+        return limit, True
+    return count, False
+
+
+class WindowedPaginator(Paginator):
+    """Паджинатор с окном номеров страниц вокруг текущей.
+
+    Вместо полного ``page_range`` странице выдаётся ``page_window``:
+    первые и последние ``on_ends`` номеров, ``on_each_side`` номеров
+    по обе стороны от текущего и ``ELLIPSIS`` на месте пропусков.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, on_each_side=2, on_ends=1,
+                 **kwargs):
+        self.on_each_side = on_each_side
+        self.on_ends = on_ends
+        super().__init__(object_list, per_page, **kwargs)
+
+    def get_page_window(self, number):
+        number = self.validate_number(number)
+        num_pages = self.num_pages
+        if num_pages <= (self.on_each_side + self.on_ends) * 2 + 1:
+            yield from self.page_range
+            return
+        if number > 1 + self.on_each_side + self.on_ends + 1:
+            yield from range(1, self.on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - self.on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < num_pages - self.on_each_side - self.on_ends - 1:
+            yield from range(number + 1, number + self.on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(num_pages - self.on_ends + 1, num_pages + 1)
+        else:
+            yield from range(number + 1, num_pages + 1)
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        page.page_window = []
+        if page.number is not None:
+            page.page_window = list(self.get_page_window(page.number))
+        return page
+
+
+class CachedCountPaginator(WindowedPaginator):
+    """Паджинатор, не считающий COUNT(*) на каждый запрос.
+
+    Общее число записей берётся из готового счётчика ``count``
+    (число или функция), иначе из кэша по ключу ``count_key``, где оно
+    хранится ``PAGINATOR_COUNT_TIMEOUT`` секунд. Если записей больше
+    ``PAGINATOR_EXACT_COUNT_LIMIT``, подсчёт останавливается на этой
+    границе, а число считается приблизительным (``count_is_approximate``).
+    """
+    count_is_approximate = False
+
+    def __init__(self, object_list, per_page, count=None, count_key=None,
+                 **kwargs):
+        self.count_source = count
+        self.count_key = count_key
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.count_source is not None:
+            if callable(self.count_source):
+                return self.count_source()
+            return self.count_source
+        if self.count_key is None:
+            count, self.count_is_approximate = self.bounded_count()
+            return count
+        cached = cache.get(self.count_key)
+        if cached is None:
+            cached = self.bounded_count()
+            cache.set(
+                self.count_key, cached, settings.PAGINATOR_COUNT_TIMEOUT
+            )
+        count, self.count_is_approximate = cached
+        return count
+
+    def get_page(self, number):
+        try:
+            return self.page(number)
+        except PageNotAnInteger:
+            return self.page(1)
+        except EmptyPage:
+            pass
+        try:
+            return self.page(self.num_pages)
+        except EmptyPage:
+            return self.page(1)
+
+    def validate_number(self, number):
+        """Номер страницы без проверки сверху: её делает ``page``."""
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        """Страница по номеру.
+
+        Счётчик может отставать от ленты, поэтому номер проверяется по
+        фактически прочитанным записям, а увиденные записи поднимают
+        ``count`` до нижней границы.
+        """
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = self.slice_rows(bottom, bottom + self.per_page + 1)
+        if not rows and number > 1:
+            raise EmptyPage('На странице нет записей')
+        self.saw_rows(bottom + len(rows))
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+    def saw_rows(self, seen):
+        """Поднять отстающий ``count`` до ``seen`` увиденных записей."""
+        if seen > self.count:
+            self.__dict__['count'] = seen
+            self.__dict__.pop('num_pages', None)
+
+    def slice_rows(self, start, stop):
+        return list(self.object_list[start:stop])
+
+    def bounded_count(self):
+        return bounded_count(self.object_list)
+
+    def get_page_window(self, number):
+        window = list(super().get_page_window(number))
+        if self.count_is_approximate and window[-1] == self.num_pages:
+            # Последние номера страниц неизвестны: обрываем окно пропуском.
+            last_known = number + self.on_each_side
+            while window[-1] != self.ELLIPSIS and window[-1] > last_known:
+                window.pop()
+            if window[-1] != self.ELLIPSIS:
+                window.append(self.ELLIPSIS)
+        return window
+
+
+class CursorPaginator(CachedCountPaginator):
+    """Паджинатор ленты по ключу (pub_date, id).
+
+    Кроме обычных номеров страниц понимает непрозрачные курсоры
+    ``after``/``before``: такая страница выбирается одним проходом
+    по индексу без OFFSET. Номер страницы, переданный
+    вместе с курсором, только подписывает её в окне номеров: ссылки
+    «назад» и «вперёд» несут номер соседней страницы.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 **kwargs):
+        self.keys = tuple(keys)
+        object_list = object_list.order_by(*('-' + key for key in self.keys))
+        super().__init__(object_list, per_page, **kwargs)
+
+    def get_page(self, number=None, after=None, before=None):
+        """Страница по курсору, а при его отсутствии — по номеру."""
+        for token, reverse in ((after, False), (before, True)):
+            values = self.decode_cursor(token)
+            if values is not None:
+                return self.seek(values, reverse, number)
+        if number == LAST_PAGE:
+            return self.seek(None, reverse=True, number=number)
+        page = super().get_page(number)
+        page.previous_cursor = None
+        page.next_cursor = None
+        if page.object_list:
+            if page.number > 1:
+                page.previous_cursor = self.encode_cursor(page.object_list[0])
+            if page.has_more:
+                page.next_cursor = self.encode_cursor(page.object_list[-1])
+        return page
+
+    def seek(self, values, reverse=False, number=None):
+        """Страница, начинающаяся сразу после ключа ``values``.
+
+        При ``reverse`` выбираются более новые записи (ссылка «назад»);
+        ``values=None`` означает начало ленты с соответствующего конца.
+        ``number`` — номер страницы для окна номеров, если он известен.
+        """
+        rows = self.fetch(values, reverse, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_previous, has_next = has_more, values is not None
+        else:
+            has_previous, has_next = values is not None, has_more
+        number = self.seek_number(number, has_previous)
+        if number is not None:
+            self.saw_rows((number - 1) * self.per_page + len(rows))
+        page = self._get_page(rows, number, self)
+        page.previous_cursor = None
+        page.next_cursor = None
+        if rows and has_previous:
+            page.previous_cursor = self.encode_cursor(rows[0])
+        if rows and has_next:
+            page.next_cursor = self.encode_cursor(rows[-1])
+        return page
+
+    def seek_number(self, number, has_previous):
+        """Номер страницы, найденной по курсору, или None."""
+        if not has_previous:
+            return 1
+        if number == LAST_PAGE:
+            if self.num_pages < 2 or self.count_is_approximate:
+                return None
+            return self.num_pages
+        try:
+            number = self.validate_number(number)
+        except (PageNotAnInteger, EmptyPage):
+            return None
+        # Перед этой страницей есть записи, значит она не первая.
+        return number if number > 1 else None
+
+    def fetch(self, values, reverse, limit):
+        """Не более ``limit`` записей за ключом в порядке обхода."""
+        return self.fetch_stream(self.object_list, self.keys,
+                                 values, reverse, limit)
+
+    def fetch_stream(self, queryset, keys, values, reverse, limit):
+        if values is not None:
+            queryset = queryset.filter(
+                self.seek_filter(values, reverse, keys))
+        if reverse:
+            queryset = queryset.reverse()
+        return list(queryset[:limit])
+
+    def seek_filter(self, values, reverse, keys=None):
+        keys = keys or self.keys
+        lookup = 'gt' if reverse else 'lt'
+        condition = Q()
+        for index, key in enumerate(keys):
+            equal = dict(zip(keys[:index], values))
+            equal[f'{key}__{lookup}'] = values[index]
+            condition |= Q(**equal)
+        return condition
+
+    def encode_cursor(self, obj):
+        values = []
+        for key in self.keys:
+            value = getattr(obj, key)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        data = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            values = json.loads(data.decode())
+        except (ValueError, TypeError, binascii.Error):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            return None
+        try:
+            values = [
+                field.to_python(value)
+                for field, value in zip(self.key_fields, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if None in values:
+            return None
+        return values
+
+    @cached_property
+    def key_fields(self):
+        """Поля ключей: по ним значения курсора приводятся к типам."""
+        query = self.object_list.query
+        fields = []
+        for key in self.keys:
+            if key in query.annotations:
+                fields.append(query.annotations[key].output_field)
+            else:
+                fields.append(self.object_list.model._meta.get_field(key))
+        return fields
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Паджинатор, сливающий несколько отсортированных потоков записей.
+
+    ``streams`` — список пар (queryset, keys), каждый поток упорядочен
+    по своим ключам, но их значения совпадают с (pub_date, id) записи.
+    Страница собирается k-путевым слиянием по ``per_page + 1`` записей
+    из каждого потока; повторы одной записи из разных потоков
+    отбрасываются. Статистика последнего слияния — в ``merge_stats`` и
+    в метриках ``yatube_timeline_merge_*``.
+
+    Номер страницы при нескольких потоках не используется: страница N
+    потребовала бы читать N страниц из каждого потока. Такие ленты
+    листаются только курсорами, а запрос по номеру отдаёт первую
+    страницу.
+    """
+
+    def __init__(self, streams, per_page, keys=('pub_date', 'id'),
+                 **kwargs):
+        self.keys = tuple(keys)
+        self.streams = [
+            (queryset.order_by(*('-' + key for key in stream_keys)),
+             tuple(stream_keys))
+            for queryset, stream_keys in streams
+        ]
+        self.merge_stats = {}
+        CachedCountPaginator.__init__(
+            self, self.streams[0][0], per_page, **kwargs)
+
+    def get_page(self, number=None, after=None, before=None):
+        if len(self.streams) > 1 and number != LAST_PAGE:
+            number = None
+        page = super().get_page(number, after, before)
+        if len(self.streams) > 1:
+            page.page_window = []
+        return page
+
+    def slice_rows(self, start, stop):
+        if len(self.streams) == 1:
+            return super().slice_rows(start, stop)
+        return self.fetch(None, False, stop)[start:]
+
+    def fetch(self, values, reverse, limit):
+        started = time.monotonic()
+        fetched = [
+            self.fetch_stream(queryset, keys, values, reverse, limit)
+            for queryset, keys in self.streams
+        ]
+        rows = []
+        last_key = None
+        for obj in heapq.merge(*fetched, key=self.sort_key,
+                               reverse=not reverse):
+            key = self.sort_key(obj)
+            if key == last_key:
+                continue
+            last_key = key
+            rows.append(obj)
+            if len(rows) == limit:
+                break
+        self.merge_stats = {
+            'streams': len(fetched),
+            'rows_fetched': sum(len(stream) for stream in fetched),
+            'rows_merged': len(rows),
+            'duration': time.monotonic() - started,
+        }
+        registry.observe('yatube_timeline_merge_streams', len(fetched))
+        registry.observe('yatube_timeline_merge_rows',
+                         self.merge_stats['rows_fetched'])
+        registry.observe('yatube_timeline_merge_duration_seconds',
+                         self.merge_stats['duration'])
+        logger.debug(
+            'Слияние %(streams)d потоков: прочитано %(rows_fetched)d, '
+            'выбрано %(rows_merged)d записей за %(duration).4f с',
+            self.merge_stats
+        )
+        return rows
+
+    def sort_key(self, obj):
+        return tuple(getattr(obj, key) for key in self.keys)
+
+    def bounded_count(self):
+        counts = [bounded_count(queryset) for queryset, _ in self.streams]
+        return (sum(count for count, _ in counts),
+                any(approximate for _, approximate in counts))
@@ -0,0 +1,87 @@
+"""Полнотекстовый поиск постов.
+
+Поиск идёт по индексу FTS5 ``posts_post_fts`` (см. миграцию
+0017_post_search): триггеры обновляют его при каждой вставке, изменении
+и удалении поста, поэтому индекс не расходится с таблицей даже при
+``bulk_create`` и ``update``. Результаты упорядочены по релевантности
+BM25, а фрагмент текста с подсвеченными словами строит ``snippet()``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+# Границы подсвеченных слов: управляющие символы не встречаются в тексте
+# и переживают экранирование HTML.
+MARK_START, MARK_END = '\x02', '\x03'
+SNIPPET_TOKENS = 24
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def has_index():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Запрос FTS5: все слова ``query``, каждое как префикс.
+
+    Операторы и кавычки пользователя не передаются в MATCH, поэтому
+    любой ввод даёт корректный запрос.
+    """
+    return ' '.join(
+        f'"{token}"*' for token in TOKEN_RE.findall(query.lower()))
+
+
+def filter_matching(queryset, query):
+    """Посты ``queryset``, в тексте которых есть все слова ``query``."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not has_index():
+        for token in TOKEN_RE.findall(query):
+            queryset = queryset.filter(text__icontains=token)
+        return queryset
+    table = Post._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[expression],
+    )
+
+
+def search_posts(query, queryset=None):
+    """Найденные посты с релевантностью ``search_rank`` и фрагментом
+    ``search_snippet``; чем больше ``search_rank``, тем выше пост.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    queryset = filter_matching(queryset, query)
+    if not has_index():
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+            search_snippet=F('text'),
+        ).order_by('-search_rank', '-id')
+    queryset = queryset.annotate(
+        search_rank=RawSQL(
+            f'-bm25({FTS_TABLE})', (), output_field=FloatField()),
+        search_snippet=RawSQL(
+            f"snippet({FTS_TABLE}, 0, %s, %s, '…', %s)",
+            (MARK_START, MARK_END, SNIPPET_TOKENS),
+            output_field=TextField(),
+        ),
+    )
+    return queryset.order_by('-search_rank', '-id')
+
+
+def highlight(snippet):
+    """HTML фрагмента: текст экранирован, найденные слова в ``<mark>``."""
+    html = escape(snippet)
+    html = html.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
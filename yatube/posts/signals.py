@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, generations, media, thumbnails, timelines
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+def post_scopes(post):
+    group_ids = {post.group_id}
+    loaded = getattr(post, '_loaded_values', {})
+    group_ids.add(loaded.get('group_id'))
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        'slug', flat=True)
+    username = User.objects.filter(pk=post.author_id).values_list(
+        'username', flat=True).first()
+    return [
+        generations.INDEX,
+        generations.profile_scope(username),
+        *(generations.group_scope(slug) for slug in slugs),
+    ]
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+def is_login_update(update_fields):
+    return update_fields and set(update_fields) <= {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    if instance.pk and not is_login_update(update_fields):
+        instance._saved_username = User.objects.filter(
+            pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, update_fields=None, **kwargs):
+    if is_login_update(update_fields):
+        return
+    usernames = {instance.username, getattr(instance, '_saved_username', None)}
+    group_slugs = Group.objects.filter(
+        group_posts__author=instance).values_list('slug', flat=True)
+    generations.bump_on_commit(
+        generations.INDEX,
+        generations.author_scope(instance.pk),
+        *(generations.profile_scope(name) for name in usernames if name),
+        *(generations.group_scope(slug) for slug in group_slugs.distinct()),
+    )
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    generations.bump_on_commit(
+        generations.INDEX, generations.group_scope(instance.slug),
+        generations.group_card_scope(instance.pk))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    generations.bump_on_commit(*post_scopes(instance))
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counters(instance.author_id, posts_count=1)
+        timelines.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, raw=False, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if instance.image and not raw and (
+            instance.image.name != loaded.get('image')):
+        thumbnails.generate_on_commit(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, raw=False, **kwargs):
+    old = getattr(instance, '_loaded_values', {}).get('image') or ''
+    new = instance.image.name or ''
+    if raw or old == new:
+        return
+    if new:
+        media.acquire(new)
+    if old:
+        media.release(old)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        media.release(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_counters(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_profile_pages(sender, instance, **kwargs):
+    usernames = User.objects.filter(
+        pk__in=[instance.user_id, instance.author_id]
+    ).values_list('username', flat=True)
+    generations.bump_on_commit(
+        *(generations.profile_scope(username) for username in usernames))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counters(instance.user_id, following_count=1)
+        counters.change_user_counters(instance.author_id, followers_count=1)
+        timelines.backfill(instance.user_id, instance.author_id)
+        timelines.followers_changed(instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    counters.change_user_counters(instance.user_id, following_count=-1)
+    counters.change_user_counters(instance.author_id, followers_count=-1)
+    timelines.remove(instance.user_id, instance.author_id)
+    timelines.followers_changed(instance.author_id, -1)
@@ -0,0 +1,57 @@
+"""Хранилище картинок постов, адресуемое по содержимому.
+
+Файл называется SHA-256 своего содержимого и раскладывается по
+вложенным каталогам по первым символам хэша:
+``posts/ab/cd/abcd…ef.jpg``. Повторная загрузка той же картинки не
+пишет новый файл, а возвращает имя уже сохранённого; сколько постов
+ссылается на файл, считает ``posts.media``.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME_RE = re.compile(
+    r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:\.\w+)?$')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(
+        directory, digest[:2], digest[2:4], digest + extension)
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """``FileSystemStorage``, сохраняющая файлы под именем-хэшем."""
+
+    def _save(self, name, content):
+        name = hashed_name(name, content_hash(content))
+        if self.exists(name):
+            # Старый файл снова нужен: свежее время изменения защищает
+            # его от gc_media, пока пост с ним не зафиксирован.
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                return super()._save(name, content)
+            return name
+        # При одновременной записи того же файла проигравший получит
+        # имя с суффиксом — лишняя копия, но не ошибка.
+        return super()._save(name, content)
+
+
+post_image_storage = ContentAddressedStorage()
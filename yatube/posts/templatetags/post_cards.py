@@ -0,0 +1,91 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from .. import generations
+from ..thumbnails import resolve
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_scopes(post):
+    """Области поколений, данные которых выводит карточка поста."""
+    scopes = [generations.author_scope(post.author_id)]
+    if post.group_id:
+        scopes.append(generations.group_card_scope(post.group_id))
+    return scopes
+
+
+def card_key(post, variant, current):
+    """Ключ карточки; ``current`` — поколения из ``get_generations``.
+
+    Переименование автора или группы не меняет ``post.updated``, но
+    сдвигает их поколения, и карточки со старыми ссылками и именами
+    перестают находиться.
+    """
+    stamps = '.'.join(str(current[scope]) for scope in card_scopes(post))
+    return 'posts:card:{}:{}:{}:{}'.format(
+        variant, post.pk, post.updated.timestamp(), stamps)
+
+
+@register.simple_tag
+def post_cards(posts, hide_author=False, hide_group=False):
+    """Отрендеренные карточки постов страницы из кэша фрагментов.
+
+    Поколения авторов и групп страницы и все карточки читаются
+    двумя ``get_many``; недостающие карточки рендерятся
+    и записываются одним ``set_many``; миниатюры их картинок находятся
+    одним вызовом ``resolve``.
+    """
+    posts = list(posts)
+    variant = f'{int(hide_author)}{int(hide_group)}'
+    current = generations.get_generations(
+        {scope for post in posts for scope in card_scopes(post)})
+    keys = [card_key(post, variant, current) for post in posts]
+    cards = cache.get_many(keys)
+    missing = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards]
+    thumbnails = resolve(post.image.name for key, post in missing)
+    rendered = {}
+    for key, post in missing:
+        rendered[key] = render_to_string(CARD_TEMPLATE, {
+            'post': post,
+            'thumbnails': thumbnails.get(post.image.name, {}),
+            'hide_author': hide_author,
+            'hide_group': hide_group,
+        })
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+@register.simple_tag
+def responsive_image(thumbnails, prefix, sizes=None, **attrs):
+    """``<img>`` с ``srcset`` из миниатюр ``<prefix>_<ширина>``.
+
+    ``thumbnails`` — словарь миниатюр картинки из ``resolve``; в ``src``
+    попадает самая широкая миниатюра, ``sizes`` по умолчанию берётся из
+    ``POST_CARD_SIZES``.
+    """
+    variants = sorted(
+        (thumbnail for alias, thumbnail in thumbnails.items()
+         if alias.startswith(prefix + '_')),
+        key=lambda thumbnail: thumbnail.width,
+    )
+    if not variants:
+        return ''
+    largest = variants[-1]
+    srcset = ', '.join(
+        f'{thumbnail.url} {thumbnail.width}w' for thumbnail in variants)
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{}>',
+        largest.url, srcset, sizes or settings.POST_CARD_SIZES,
+        largest.width, largest.height, extra,
+    )
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.groups = Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group-{i}') for i in range(3))
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def create_posts(self, count):
+        groups = list(Group.objects.all())
+        Post.objects.bulk_create(
+            Post(author=self.admin, text=f'Пост {i}',
+                 group=groups[i % len(groups)])
+            for i in range(count))
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.create_posts(2)
+        few = self.changelist_queries()
+        self.create_posts(20)
+        many = self.changelist_queries()
+        self.assertEqual(len(few), len(many))
+        group_queries = [
+            sql for sql in many
+            if sql.startswith('SELECT "posts_group"."id"')]
+        self.assertEqual(len(group_queries), 1)
+
+    def test_no_full_table_count(self):
+        self.create_posts(3)
+        counts = [
+            sql for sql in self.changelist_queries() if 'COUNT(' in sql]
+        self.assertEqual(len(counts), 1)
+        self.assertIn('LIMIT', counts[0])
+
+    def test_date_hierarchy_drill_down(self):
+        self.create_posts(3)
+        post = Post.objects.first()
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'),
+            {'pub_date__year': post.pub_date.year},
+        )
+        self.assertEqual(response.context['cl'].result_count, 3)
@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import benchmarks
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_load', users=40, groups=4, posts=300, comments=600,
+            follows=200, stdout=StringIO())
+
+    def test_views_fit_query_budgets(self):
+        """Представления укладываются в бюджеты запросов."""
+        results = benchmarks.run(iterations=2)
+        self.assertEqual(set(results), set(benchmarks.QUERY_BUDGETS))
+        self.assertEqual(benchmarks.check({'test': results}), [])
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        """Число запросов страницы поста не зависит от комментариев."""
+        before = benchmarks.run(iterations=1, views=['post_detail'])
+        benchmarks.run(iterations=10, views=['add_comment'])
+        after = benchmarks.run(iterations=1, views=['post_detail'])
+        self.assertEqual(
+            after['post_detail']['cold']['queries'],
+            before['post_detail']['cold']['queries'])
+
+    def test_regressions_against_baseline_are_reported(self):
+        """Рост запросов и задержки относительно базы — нарушение."""
+        summary = {'p50': 1, 'p95': 1, 'p99': 1, 'mean': 1, 'queries': 3}
+        results = {'small': {'index': {
+            'cold': {**summary, 'p95': 50.0},
+            'warm': {**summary, 'queries': 4},
+        }}}
+        baseline = {'small': {'index': {'cold': summary, 'warm': summary}}}
+        failures = benchmarks.check(results, baseline, tolerance=2)
+        self.assertEqual(len(failures), 2)
+        self.assertIn('small/index/cold: p95', failures[0])
+        self.assertIn('small/index/warm: 4 запросов', failures[1])
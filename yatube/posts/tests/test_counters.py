@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.follower, text='Комментарий')
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.follower).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.follower).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_drifted_counters_do_not_go_negative(self):
+        """Удаление при обнулённом счётчике не роняет запрос."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Comment.objects.create(
+            post=post, author=self.follower, text='Комментарий')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        UserStats.objects.update(
+            posts_count=0, followers_count=0, following_count=0)
+        self.client.force_login(self.follower)
+        response = self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(response.status_code, 302)
+        Comment.objects.all().delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.follower).following_count, 0)
+
+    def test_profile_reads_counters(self):
+        """Профиль выводит счётчики без подсчёта постов."""
+        Post.objects.create(author=self.author, text='Тестовый пост')
+        response = Client().get(
+            reverse('posts:profile', kwargs={'username': self.author}))
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        self.assertContains(response, 'Подписчиков: 0')
+
+    def test_recount_counters_command(self):
+        """Команда recount_counters чинит рассинхронизированные счётчики."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(3))
+        UserStats.objects.filter(user=self.author).delete()
+        call_command('recount_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 3)
@@ -0,0 +1,95 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..export import export, iter_rows
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}')
+            for i in range(5)
+        ]
+        Post.objects.create(author=cls.reader, text='Чужой пост')
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_rows_are_read_in_chunks(self):
+        """Строки читаются пачками по ключу, без пропусков и повторов."""
+        with self.assertNumQueries(3):
+            rows = list(iter_rows('posts', chunk_size=3))
+        self.assertEqual(
+            [row['id'] for row in rows],
+            sorted(Post.objects.values_list('id', flat=True)))
+        self.assertEqual(rows[0]['author'], 'author')
+        self.assertEqual(rows[0]['group'], 'group')
+
+    def test_gzip_csv_export(self):
+        """CSV со сжатием распаковывается в заголовок и строки."""
+        data = b''.join(export('follows', 'csv', compress=True))
+        rows = list(csv.DictReader(
+            io.StringIO(gzip.decompress(data).decode())))
+        self.assertEqual(
+            rows, [{'id': str(Follow.objects.get().pk),
+                    'user': 'reader', 'author': 'author'}])
+
+    def test_export_content_command(self):
+        """Команда пишет по файлу на набор, посты читает import_posts."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        call_command(
+            'export_content', '--output-dir', directory, stdout=io.StringIO())
+        self.assertEqual(
+            sorted(os.listdir(directory)),
+            ['comments.jsonl', 'follows.jsonl', 'posts.jsonl'])
+        with open(os.path.join(directory, 'comments.jsonl')) as file:
+            comment = json.loads(file.read())
+        self.assertEqual(comment['text'], 'Комментарий')
+        path = os.path.join(directory, 'posts.jsonl')
+        Post.objects.all().delete()
+        call_command('import_posts', path, stdout=io.StringIO())
+        self.assertEqual(Post.objects.count(), 6)
+
+    def test_profile_export_streams_own_posts(self):
+        """Автор скачивает свои посты потоком."""
+        response = self.author_client.get(
+            reverse('posts:profile_export', kwargs={'username': 'author'}),
+            {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertIn('author-posts.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(
+            b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), len(self.posts))
+        self.assertEqual({row['author'] for row in rows}, {'author'})
+
+    def test_profile_export_is_only_for_author(self):
+        """Чужие посты скачать нельзя."""
+        response = self.author_client.get(
+            reverse('posts:profile_export', kwargs={'username': 'reader'}))
+        self.assertRedirects(
+            response,
+            reverse('posts:profile', kwargs={'username': 'reader'}))
@@ -6,7 +6,7 @@ from django.conf import settings
 import tempfile
 import shutil
 
-from ..models import Post, Group
+from ..models import MediaFile, Post, Group
 
 User = get_user_model()
 
@@ -74,7 +74,17 @@ class PostURLTests(TestCase):
                              )
         self.assertEqual(Post.objects.count(), posts_count + 1)
         self.assertEqual(self.post.author, response.context['author'])
-        self.assertTrue(Post.objects.filter(image='posts/small.gif').exists())
+        new_post = Post.objects.get(text='Тестовый пост 2')
+        self.assertTrue(new_post.image)
+        self.uploaded.seek(0)
+        author_client.post(reverse('posts:post_create'), data={
+            'text': 'Тестовый пост 3',
+            'image': self.uploaded,
+        })
+        # Одинаковые картинки хранятся одним файлом с общим счётчиком.
+        name = new_post.image.name
+        self.assertEqual(Post.objects.filter(image=name).count(), 2)
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
 
     def test_edit_post(self):
         """Валидная форма изменяет Post в БД"""
@@ -110,4 +120,5 @@ class PostURLTests(TestCase):
         self.assertEqual(group2.group_posts.count(), posts_count_group2 - 1)
         self.assertEqual(post.author, response.context['user'])
         self.assertEqual(self.group, Post.objects.all()[0].group)
-        self.assertTrue(Post.objects.filter(image='posts/small.gif').exists())
+        self.assertTrue(
+            Post.objects.filter(image=self.post.image.name).exists())
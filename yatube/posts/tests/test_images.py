@@ -0,0 +1,104 @@
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image, ImageSequence
+
+from ..forms import PostForm
+from ..images import ingest
+
+
+def make_upload(name, size=(100, 50), mode='RGB', image_format='JPEG',
+                **params):
+    output = BytesIO()
+    Image.new(mode, size, 'red').save(output, image_format, **params)
+    return SimpleUploadedFile(name, output.getvalue())
+
+
+class IngestTests(TestCase):
+    @override_settings(POST_IMAGE_MAX_SIDE=40)
+    def test_large_image_is_downsized_without_metadata(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        upload = make_upload('photo.jpeg', exif=exif.tobytes())
+        stored, report = ingest(upload)
+        image = Image.open(stored)
+        self.assertEqual(stored.name, 'photo.jpg')
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (40, 20))
+        self.assertNotIn('exif', image.info)
+        self.assertEqual(report.original_size, upload.size)
+        self.assertEqual(report.stored_size, stored.size)
+
+    def test_transparent_image_stays_png(self):
+        stored, report = ingest(
+            make_upload('logo.png', mode='RGBA', image_format='PNG'))
+        self.assertEqual(stored.name, 'logo.png')
+        self.assertEqual(Image.open(stored).mode, 'RGBA')
+
+    def make_animation(self, size=(10, 10)):
+        frames = [Image.new('P', size, color) for color in (1, 2)]
+        output = BytesIO()
+        frames[0].save(output, 'GIF', save_all=True,
+                       append_images=frames[1:], duration=[50, 70],
+                       comment=b'metadata')
+        return SimpleUploadedFile('anim.gif', output.getvalue())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=5)
+    def test_animated_image_is_reencoded_per_frame(self):
+        stored, report = ingest(self.make_animation())
+        image = Image.open(stored)
+        self.assertEqual(stored.name, 'anim.gif')
+        self.assertEqual(image.n_frames, 2)
+        self.assertEqual(image.size, (5, 5))
+        self.assertNotIn('comment', image.info)
+        durations = []
+        for frame in ImageSequence.Iterator(image):
+            durations.append(frame.info['duration'])
+        self.assertEqual(durations, [50, 70])
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=150)
+    def test_animation_pixel_limit_counts_frames(self):
+        with self.assertRaises(ValidationError) as error:
+            ingest(self.make_animation())
+        self.assertEqual(error.exception.code, 'too_many_pixels')
+
+    def test_truncated_image_is_rejected(self):
+        upload = make_upload('photo.jpg', size=(200, 200))
+        upload = SimpleUploadedFile(
+            'photo.jpg', upload.read()[:upload.size // 2])
+        with self.assertRaises(ValidationError) as error:
+            ingest(upload)
+        self.assertEqual(error.exception.code, 'invalid_image')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_pixel_limit(self):
+        with self.assertRaises(ValidationError) as error:
+            ingest(make_upload('big.jpg', size=(20, 20)))
+        self.assertEqual(error.exception.code, 'too_many_pixels')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=10)
+    def test_byte_limit(self):
+        with self.assertRaises(ValidationError) as error:
+            ingest(make_upload('heavy.jpg'))
+        self.assertEqual(error.exception.code, 'file_too_large')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_form_reports_limit(self):
+        form = PostForm(
+            data={'text': 'Текст'},
+            files={'image': make_upload('big.jpg', size=(20, 20))},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_form_rejects_truncated_image(self):
+        upload = make_upload('photo.jpg', size=(200, 200))
+        form = PostForm(
+            data={'text': 'Текст'},
+            files={'image': SimpleUploadedFile(
+                'photo.jpg', upload.read()[:upload.size // 2])},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
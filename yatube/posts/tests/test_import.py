@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Follow, Group, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class ImportPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def import_posts(self, path, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'import_posts', path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_jsonl_import_keeps_dates_and_updates_derived_data(self):
+        """JSONL: даты сохраняются, счётчики и ленты обновляются."""
+        rows = [
+            {'text': 'Первый', 'author': 'author', 'group': 'group',
+             'pub_date': '2020-01-02T03:04:05'},
+            {'text': 'Второй', 'author': 'author'},
+            {'text': '', 'author': 'author'},
+            {'text': 'Чужой', 'author': 'nobody'},
+        ]
+        path = self.write('posts.jsonl', '\n'.join(map(json.dumps, rows)))
+        _, stderr = self.import_posts(path, '--batch-size', '3')
+        self.assertIn('Запись 3', stderr)
+        first = Post.objects.get(text='Первый')
+        self.assertEqual(first.group, self.group)
+        self.assertEqual(first.pub_date, timezone.make_aware(
+            datetime(2020, 1, 2, 3, 4, 5)))
+        self.assertEqual(first.updated, first.pub_date)
+        self.assertFalse(Post.objects.filter(text='Чужой').exists())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower).count(), 2)
+
+    def test_malformed_rows_are_counted_not_fatal(self):
+        """Записи неверной формы — ошибки строк, загрузка продолжается."""
+        lines = [
+            '[1, 2]',
+            '"x"',
+            json.dumps({'text': 5, 'author': 'author'}),
+            json.dumps({'text': 'Пост', 'author': 'author',
+                        'pub_date': '2020-13-45T00:00'}),
+            json.dumps({'text': 'Пост', 'author': 'author',
+                        'group': 'nowhere'}),
+            json.dumps({'text': 'Целый', 'author': 'author'}),
+        ]
+        path = self.write('posts.jsonl', '\n'.join(lines))
+        stdout, stderr = self.import_posts(path)
+        self.assertIn('ошибок: 5', stdout)
+        for number in range(1, 6):
+            with self.subTest(number=number):
+                self.assertIn(f'Запись {number}:', stderr)
+        self.assertIn("неизвестная группа 'nowhere'", stderr)
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Целый'])
+
+    def test_csv_import_creates_missing(self):
+        """CSV: с --create-missing создаются авторы и группы."""
+        path = self.write(
+            'posts.csv',
+            'text,author,group,pub_date\n'
+            'Новый,newbie,fresh,2021-05-06 07:08:09\n'
+        )
+        self.import_posts(path, '--create-missing')
+        post = Post.objects.get(text='Новый')
+        self.assertEqual(post.author.username, 'newbie')
+        self.assertFalse(post.author.has_usable_password())
+        self.assertEqual(post.group.slug, 'fresh')
+
+    def test_malformed_csv_is_reported_with_line(self):
+        """Незакрытая кавычка в CSV останавливает загрузку."""
+        path = self.write(
+            'posts.csv',
+            'text,author\n'
+            'Целый,author\n'
+            '"Оборванный,author\n'
+        )
+        with self.assertRaisesMessage(CommandError, 'Запись 2 (строка 3)'):
+            self.import_posts(path)
+
+    def test_batch_size_must_be_positive(self):
+        path = self.write(
+            'posts.jsonl', '{"text": "Пост", "author": "author"}')
+        with self.assertRaises(CommandError):
+            self.import_posts(path, '--batch-size', '0')
+        self.assertFalse(Post.objects.exists())
+
+    def test_import_resumes_from_checkpoint(self):
+        """Повторный запуск продолжает с контрольной точки."""
+        rows = [{'text': f'Пост {i}', 'author': 'author'} for i in range(5)]
+        path = self.write('posts.jsonl', '\n'.join(map(json.dumps, rows)))
+        with open(path + '.checkpoint', 'w', encoding='utf-8') as file:
+            json.dump({'path': os.path.abspath(path), 'rows': 3}, file)
+        stdout, _ = self.import_posts(path, '--batch-size', '2')
+        self.assertIn('Продолжаем с записи 4', stdout)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            ['Пост 3', 'Пост 4'])
+        with open(path + '.checkpoint', encoding='utf-8') as file:
+            self.assertEqual(json.load(file)['rows'], 5)
+        self.import_posts(path)
+        self.assertEqual(Post.objects.count(), 2)
@@ -0,0 +1,105 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import OperationalError, close_old_connections
+from django.test import TestCase, TransactionTestCase
+
+from yatube.wsgi import application
+
+from .. import loadtest
+from ..counters import recount_users
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+PASSWORD = 'load-password'
+
+
+class WSGIClientTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', password=PASSWORD)
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        # Как тестовый клиент Django: сигналы закрыли бы соединение
+        # посреди транзакции теста.
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    def test_login_and_post_with_csrf(self):
+        """Клиент входит в систему и отправляет форму с токеном CSRF."""
+        client = loadtest.WSGIClient(application)
+        self.assertTrue(client.login('reader', PASSWORD))
+        status, _ = client.request(
+            'POST', f'/posts/{self.post.pk}/comment/', {'text': 'Привет'})
+        self.assertEqual(status, 302)
+        self.assertTrue(Comment.objects.filter(
+            author=self.user, text='Привет').exists())
+
+    def test_wrong_password(self):
+        client = loadtest.WSGIClient(application)
+        self.assertFalse(client.login('reader', 'wrong'))
+
+
+class ReportTests(TestCase):
+    def test_error_kinds(self):
+        """Блокировки SQLite считаются отдельно от прочих ошибок."""
+        locked = OperationalError('database is locked')
+        self.assertEqual(loadtest.error_kind(500, locked), 'sqlite_locked')
+        self.assertEqual(
+            loadtest.error_kind(500, ValueError()), 'exception')
+        self.assertEqual(loadtest.error_kind(502, None), 'server_error')
+        self.assertEqual(loadtest.error_kind(404, None), 'client_error')
+        self.assertIsNone(loadtest.error_kind(302, None))
+
+    def test_report(self):
+        stats = loadtest.Stats()
+        for elapsed in (1, 7, 30, 9000):
+            stats.record('index', elapsed, 100, None)
+        stats.record('index', 3, 0, 'server_error')
+        report = stats.report(elapsed=2)
+        self.assertEqual(report['requests'], 5)
+        self.assertEqual(report['throughput'], 2.5)
+        self.assertEqual(report['errors'], {'server_error': 1})
+        histogram = report['actions']['index']['histogram']
+        self.assertEqual(histogram['5'], 2)
+        self.assertEqual(histogram['10'], 1)
+        self.assertEqual(histogram['50'], 1)
+        self.assertEqual(histogram['+Inf'], 1)
+
+
+class LoadTestRunTests(TransactionTestCase):
+    def test_anonymous_run(self):
+        """Прогон останавливается на заданном числе запросов."""
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(author=author, group=group, text='Пост')
+        Post.objects.create(author=author, text='Ещё пост')
+        recount_users([author.pk])
+        report = loadtest.LoadTest(
+            application, loadtest.load_targets(), PASSWORD,
+            workers=2, requests=20, logged_in_ratio=0,
+        ).run()
+        self.assertEqual(report['requests'], 20)
+        self.assertEqual(report['errors'], {})
+        self.assertFalse(
+            {'feed', 'comment', 'create', 'follow'} & set(report['actions']))
+
+    def test_command_writes_to_database_copy(self):
+        """Команда по умолчанию пишет не в настроенную базу, а в копию."""
+        author = User.objects.create_user(
+            username='author', password=PASSWORD)
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(author=author, group=group, text='Пост')
+        recount_users([author.pk])
+        call_command(
+            'loadtest', '--workers=1', '--requests=30',
+            '--logged-in-ratio=1', f'--password={PASSWORD}',
+            stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
@@ -0,0 +1,153 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+from ..models import Post
+
+User = get_user_model()
+
+
+def sample(text, series):
+    """Значение ряда ``series`` в выдаче /metrics, 0 — если его нет."""
+    match = re.search(rf'^{re.escape(series)} (\S+)$', text, re.M)
+    return float(match.group(1)) if match else 0
+
+
+class MetricsEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_view_metrics(self):
+        """Запросы, SQL и шаблоны считаются по имени представления."""
+        view = 'view="posts:index"'
+        before = self.scrape()
+        self.client.get(reverse('posts:index'))
+        after = self.scrape()
+        requests = (
+            f'yatube_requests_total{{method="GET",status="200",{view}}}')
+        self.assertEqual(sample(after, requests) - sample(before, requests), 1)
+        for name in ('yatube_request_duration_seconds', 'yatube_db_queries',
+                     'yatube_template_render_seconds',
+                     'yatube_response_size_bytes'):
+            series = f'{name}_count{{{view}}}'
+            self.assertEqual(
+                sample(after, series) - sample(before, series), 1, name)
+        self.assertGreater(
+            sample(after, f'yatube_db_queries_sum{{{view}}}'),
+            sample(before, f'yatube_db_queries_sum{{{view}}}'))
+        self.assertIn(
+            f'yatube_request_duration_seconds_bucket{{{view},le="+Inf"}}',
+            after)
+
+    def test_cache_page_hits_and_misses(self):
+        """Промах и попадание в кэш страниц видны по семействам ключей."""
+        series = 'yatube_cache_requests_total{{family="{}",result="{}"}}'
+        before = self.scrape()
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        after = self.scrape()
+        for family, result in (('cache_header', 'miss'),
+                               ('cache_header', 'hit'),
+                               ('cache_page', 'hit')):
+            self.assertEqual(
+                sample(after, series.format(family, result))
+                - sample(before, series.format(family, result)),
+                1, (family, result))
+
+    def test_metrics_hidden_from_other_hosts(self):
+        response = Client(REMOTE_ADDR='10.0.0.1').get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_required(self):
+        """С METRICS_TOKEN адрес прокси не открывает /metrics."""
+        self.assertEqual(
+            self.client.get(reverse('metrics')).status_code, 404)
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 404)
+        response = Client(REMOTE_ADDR='10.0.0.1').get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class RegistryTests(TestCase):
+    def test_processes_are_summed(self):
+        """Метрики других процессов из METRICS_DIR складываются."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        other = metrics.Registry()
+        other.inc('yatube_requests_total', 2, view='posts:index')
+        other.observe(
+            'yatube_request_duration_seconds', 0.2, view='posts:index')
+        with open(os.path.join(directory, '1-1.json'), 'w') as file:
+            json.dump(other.snapshot(), file)
+        registry = metrics.Registry()
+        registry.inc('yatube_requests_total', 3, view='posts:index')
+        registry.observe(
+            'yatube_request_duration_seconds', 0.02, view='posts:index')
+        with override_settings(METRICS_DIR=directory):
+            values = registry.collect()
+        self.assertEqual(len(os.listdir(directory)), 2)
+        text = metrics.render(values)
+        self.assertIn(
+            'yatube_requests_total{view="posts:index"} 5', text)
+        self.assertIn('yatube_request_duration_seconds_bucket'
+                      '{view="posts:index",le="0.025"} 1', text)
+        self.assertIn('yatube_request_duration_seconds_bucket'
+                      '{view="posts:index",le="0.25"} 2', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text)
+
+    def test_exited_processes_are_compacted(self):
+        """Файлы завершившихся процессов складываются в один."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = metrics.Registry()
+        with override_settings(METRICS_DIR=directory):
+            for _ in range(2):
+                process = subprocess.Popen([sys.executable, '-c', ''])
+                process.wait()
+                exited = metrics.Registry()
+                exited.inc('yatube_requests_total', 2, view='posts:index')
+                with open(os.path.join(
+                        directory, f'{process.pid}-1.json'), 'w') as file:
+                    json.dump(exited.snapshot(), file)
+                values = registry.collect()
+            own = os.path.basename(registry.path())
+        self.assertEqual(
+            sorted(os.listdir(directory)), sorted([metrics.EXITED_FILE, own]))
+        self.assertIn(
+            'yatube_requests_total{view="posts:index"} 4',
+            metrics.render(values))
+
+    def test_key_family(self):
+        self.assertEqual(metrics.key_family(
+            'views.decorators.cache.cache_page.index.GET.abc.def.ru.UTC'),
+            'cache_page')
+        self.assertEqual(
+            metrics.key_family('posts:generation:index'), 'posts:generation')
+        self.assertEqual(
+            metrics.key_family('posts:thumbnail:0af3'), 'posts:thumbnail')
@@ -1,6 +1,10 @@
+from django.db import connection
 from django.test import TestCase
 
-from ..models import Group, Post, User, TEXT_LEN
+from yatube.settings import POSTS_PER_PAGE
+from ..models import Follow, Group, Post, User, TEXT_LEN
+from ..paginators import CursorPaginator
+from ..timelines import FEED_KEYS, POST_KEYS, timeline_posts
 
 
 class PostModelTest(TestCase):
@@ -23,3 +27,46 @@ class PostModelTest(TestCase):
         """Проверяем, что у моделей корректно работает __str__."""
         self.assertEqual(str(self.group), self.group.title)
         self.assertEqual(str(self.post), self.post.text[:TEXT_LEN])
+
+
+class FeedIndexesTest(TestCase):
+    """Запросы лент читаются по индексу, без сортировки во временном
+    B-дереве."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='test_slug')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост')
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты, комментарии и подписки используют составные индексы."""
+        feeds = {
+            'post_pub_date_idx': Post.objects.all(),
+            'post_author_pub_date_idx': self.user.posts.all(),
+            'post_group_pub_date_idx': self.group.group_posts.all(),
+            'timeline_user_pub_date_idx': timeline_posts(self.user),
+        }
+        querysets = {
+            index: CursorPaginator(
+                posts.select_related('author', 'group'), POSTS_PER_PAGE,
+                keys=FEED_KEYS if 'timeline' in index else POST_KEYS,
+            ).object_list[:POSTS_PER_PAGE + 1]
+            for index, posts in feeds.items()
+        }
+        querysets['comment_post_created_idx'] = self.post.comments.all()
+        # Уникальное ограничение SQLite создаёт как автоматический индекс.
+        querysets['user_id=? AND author_id=?'] = Follow.objects.filter(
+            user=self.user, author=self.user)
+        for index, queryset in querysets.items():
+            with self.subTest(index=index):
+                plan = self.query_plan(queryset)
+                self.assertNotIn('TEMP B-TREE', plan)
+                self.assertIn(index, plan)
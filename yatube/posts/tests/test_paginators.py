@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..models import Post
+from ..paginators import CachedCountPaginator, WindowedPaginator
+
+User = get_user_model()
+
+ELLIPSIS = WindowedPaginator.ELLIPSIS
+
+
+class WindowedPaginatorTests(SimpleTestCase):
+    def setUp(self):
+        self.paginator = WindowedPaginator(range(1000), 10)
+
+    def test_page_window_elides_gaps(self):
+        """Окно страниц содержит края, соседей текущей и пропуски."""
+        cases = {
+            1: [1, 2, 3, ELLIPSIS, 100],
+            4: [1, 2, 3, 4, 5, 6, ELLIPSIS, 100],
+            50: [1, ELLIPSIS, 48, 49, 50, 51, 52, ELLIPSIS, 100],
+            100: [1, ELLIPSIS, 98, 99, 100],
+        }
+        for number, expected in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    self.paginator.get_page(number).page_window, expected
+                )
+
+    def test_short_range_is_not_elided(self):
+        """Короткая лента выводится без пропусков."""
+        paginator = WindowedPaginator(range(50), 10)
+        self.assertEqual(paginator.get_page(3).page_window, [1, 2, 3, 4, 5])
+
+
+class CachedCountPaginatorTests(TestCase):
+    POSTS_COUNT = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}')
+            for i in range(cls.POSTS_COUNT)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_read_from_cache(self):
+        """Повторный подсчёт берётся из кэша без запроса к БД."""
+        posts = Post.objects.all()
+        first = CachedCountPaginator(posts, 10, count_key='test:count')
+        self.assertEqual(first.count, self.POSTS_COUNT)
+        second = CachedCountPaginator(posts, 10, count_key='test:count')
+        with self.assertNumQueries(0):
+            self.assertEqual(second.count, self.POSTS_COUNT)
+
+    def test_count_hint_skips_query(self):
+        """Готовый счётчик используется вместо COUNT(*)."""
+        paginator = CachedCountPaginator(Post.objects.all(), 10, count=7)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.num_pages, 1)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_LIMIT=20)
+    def test_huge_count_is_approximate(self):
+        """Подсчёт обрывается на границе и помечается приблизительным."""
+        paginator = CachedCountPaginator(Post.objects.all(), 5)
+        self.assertEqual(paginator.count, 20)
+        self.assertTrue(paginator.count_is_approximate)
+        self.assertEqual(paginator.get_page(1).page_window,
+                         [1, 2, 3, ELLIPSIS])
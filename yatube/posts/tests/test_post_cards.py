@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+
+from .. import generations
+from ..models import Group, Post
+from ..templatetags.post_cards import (
+    card_key, card_scopes, post_cards, responsive_image)
+from ..thumbnails import Thumbnail
+
+User = get_user_model()
+
+
+class PostCardsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}') for i in range(3))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_are_rendered_once(self):
+        """Повторный вывод карточек собирается из кэша."""
+        posts = Post.objects.all()
+        first = post_cards(posts)
+        for post in posts:
+            current = generations.get_generations(card_scopes(post))
+            self.assertIsNotNone(cache.get(card_key(post, '00', current)))
+        posts = list(Post.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(post_cards(posts), first)
+        # Без кэша каждая карточка запросила бы автора поста.
+        self.assertEqual(len(queries), 0)
+
+    def test_edited_post_is_rerendered(self):
+        """Изменение поста меняет ключ его карточки."""
+        post = Post.objects.first()
+        post_cards([post])
+        post.text = 'Изменённый текст'
+        post.save()
+        self.assertIn('Изменённый текст', post_cards([post])[0])
+
+    def test_renamed_author_and_group_are_rerendered(self):
+        """Новое имя пользователя и адрес группы меняют ключ карточки."""
+        group = Group.objects.create(
+            title='Группа', slug='old-slug', description='Описание')
+        post = Post.objects.create(
+            author=self.user, group=group, text='Пост в группе')
+        post_cards([post])
+        self.user.username = 'renamed'
+        self.user.first_name = 'Новое'
+        self.user.save()
+        group.slug = 'new-slug'
+        group.save()
+        post = Post.objects.select_related('author', 'group').get(
+            pk=post.pk)
+        card = post_cards([post])[0]
+        self.assertIn('/profile/renamed/', card)
+        self.assertIn('/group/new-slug/', card)
+        self.assertNotIn('old-slug', card)
+
+
+class ResponsiveImageTests(TestCase):
+    def test_srcset_from_variants(self):
+        thumbnails = {
+            'card_960': Thumbnail('/media/960.jpg', 960, 339),
+            'card_320': Thumbnail('/media/320.jpg', 320, 113),
+            'other_640': Thumbnail('/media/other.jpg', 640, 640),
+        }
+        html = responsive_image(
+            thumbnails, 'card', sizes='50vw', **{'class': 'card-img'})
+        self.assertHTMLEqual(
+            html,
+            '<img src="/media/960.jpg" '
+            'srcset="/media/320.jpg 320w, /media/960.jpg 960w" '
+            'sizes="50vw" width="960" height="339" class="card-img">'
+        )
+
+    def test_no_variants(self):
+        self.assertEqual(responsive_image({}, 'card'), '')
@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import highlight, match_expression, search_posts
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.often = Post.objects.create(
+            author=cls.user, text='Котики, котики и ещё раз котики')
+        cls.once = Post.objects.create(
+            author=cls.user, text='Про котиков и <b>собак</b>')
+        cls.other = Post.objects.create(author=cls.user, text='Про погоду')
+
+    def test_ranked_results(self):
+        """Посты с большим числом совпадений идут первыми."""
+        self.assertEqual(
+            list(search_posts('котик')), [self.often, self.once])
+
+    def test_index_follows_changes(self):
+        post = Post.objects.create(author=self.user, text='Котик на погоде')
+        self.assertIn(post, search_posts('погоде'))
+        post.text = 'Ёжик на погоде'
+        post.save()
+        self.assertFalse(search_posts('котик').filter(pk=post.pk).exists())
+        self.assertIn(post, search_posts('ёжик'))
+        post.delete()
+        self.assertFalse(search_posts('погоде').exists())
+
+    def test_any_input_is_valid_query(self):
+        self.assertEqual(match_expression('"котик" OR -(собак*'),
+                         '"котик"* "or"* "собак"*')
+        self.assertFalse(search_posts('"()*').exists())
+
+    def test_snippet_is_escaped(self):
+        snippet = search_posts('собак').get().search_snippet
+        self.assertEqual(
+            highlight(snippet),
+            'Про котиков и &lt;b&gt;<mark>собак</mark>&lt;/b&gt;')
+
+    def test_search_view(self):
+        response = self.client.get(reverse('posts:search'), {'q': 'собак'})
+        self.assertEqual(list(response.context['page_obj']), [self.once])
+        self.assertContains(response, '<mark>собак</mark>', html=False)
+
+    def test_search_pages_keep_query(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Котик номер {i}')
+            for i in range(settings.POSTS_PER_PAGE))
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'котик'})
+        page = response.context['page_obj']
+        self.assertEqual(len(page), settings.POSTS_PER_PAGE)
+        self.assertContains(
+            response, f'?q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA&amp;after='
+                      f'{page.next_cursor}')
+        response = self.client.get(
+            url, {'q': 'котик', 'after': page.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.once])
@@ -0,0 +1,86 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import Count, F
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+SIZES = {
+    'users': 30, 'groups': 4, 'posts': 200, 'comments': 300,
+    'follows': 120, 'batch_size': 50,
+}
+
+
+class SeedLoadTests(TestCase):
+    def seed(self, **options):
+        call_command('seed_load', stdout=StringIO(), **{**SIZES, **options})
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('pk').values_list('username')),
+            list(Group.objects.order_by('pk').values_list('title', 'slug')),
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'author__username', 'group__slug',
+                'comments_count')),
+            list(Follow.objects.order_by('user', 'author').values_list(
+                'user__username', 'author__username')),
+        )
+
+    def test_seed_creates_consistent_data(self):
+        """Счётчики и ленты сходятся с созданными строками."""
+        self.seed()
+        self.assertEqual(User.objects.count(), SIZES['users'])
+        self.assertEqual(Post.objects.count(), SIZES['posts'])
+        self.assertTrue(Comment.objects.exists())
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+        for post in Post.objects.annotate(total=Count('comments')):
+            self.assertEqual(post.comments_count, post.total)
+        for stats in UserStats.objects.all():
+            self.assertEqual(
+                stats.posts_count,
+                Post.objects.filter(author_id=stats.user_id).count())
+            self.assertEqual(
+                stats.followers_count,
+                Follow.objects.filter(author_id=stats.user_id).count())
+        expected = sum(
+            Post.objects.filter(author_id=author_id).count()
+            for author_id in Follow.objects.values_list(
+                'author_id', flat=True)
+        )
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+        dates = list(Post.objects.order_by('pk').values_list(
+            'pub_date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+
+    def test_batch_size_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            self.seed(batch_size=0)
+
+    def test_seed_is_skewed(self):
+        """Подписчики и посты распределены по степенному закону."""
+        self.seed(users=300, follows=600)
+        followers = list(UserStats.objects.order_by(
+            '-followers_count').values_list('followers_count', flat=True))
+        self.assertGreater(followers[0], 5 * followers[len(followers) // 2])
+        groups = list(Group.objects.annotate(
+            total=Count('group_posts')).order_by('-total').values_list(
+            'total', flat=True))
+        self.assertGreater(groups[0], groups[-1])
+
+    def test_seed_is_deterministic(self):
+        """Одинаковое зерно даёт одинаковые данные."""
+        self.seed(seed=7)
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(seed=7)
+        self.assertEqual(self.snapshot(), first)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(seed=8)
+        self.assertNotEqual(self.snapshot(), first)
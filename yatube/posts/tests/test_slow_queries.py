@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import slow_queries
+
+from ..models import Post
+
+User = get_user_model()
+
+
+class NormalizeTests(TestCase):
+    def test_same_fingerprint_for_different_values(self):
+        """Значения, числа и длина IN (…) не меняют отпечаток."""
+        first = ('SELECT * FROM "posts_post" WHERE "id" IN (%s, %s) '
+                 "AND text = 'a' LIMIT 10")
+        second = ('SELECT  * FROM "posts_post" WHERE "id" IN (%s) '
+                  "AND text = 'b''c' LIMIT 20")
+        self.assertEqual(
+            slow_queries.fingerprint(first),
+            slow_queries.fingerprint(second))
+        self.assertEqual(
+            slow_queries.normalize(first),
+            'SELECT * FROM "posts_post" WHERE "id" IN (...) '
+            'AND text = ? LIMIT ?')
+        self.assertNotEqual(
+            slow_queries.fingerprint(first),
+            slow_queries.fingerprint('SELECT * FROM "posts_group"'))
+
+    def test_multirow_values(self):
+        self.assertEqual(
+            slow_queries.normalize(
+                'INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)'),
+            'INSERT INTO t (a, b) VALUES (?, ?), ...')
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.log = os.path.join(directory, 'slow.jsonl')
+        slow_queries._explained.clear()
+        settings = override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=self.log)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def entries(self):
+        slow_queries.journal.handler.flush()
+        with open(self.log, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_request_queries_are_logged_with_plan_once(self):
+        """Запрос пишется с представлением, местом в коде и планом."""
+        self.client.get(reverse('posts:profile', args=['author']))
+        cache.clear()
+        self.client.get(reverse('posts:profile', args=['author']))
+        entries = [
+            entry for entry in self.entries()
+            if entry['view'] == 'posts:profile'
+            and entry['site'] and 'posts/views.py' in entry['site']
+        ]
+        self.assertTrue(entries)
+        digests = [entry['fingerprint'] for entry in entries]
+        with_plan = [entry for entry in entries if 'plan' in entry]
+        # План снят один раз на отпечаток, хотя страниц было две.
+        self.assertEqual(
+            len(with_plan), len(set(digests)))
+        self.assertLess(len(with_plan), len(entries))
+        if connection.vendor == 'sqlite':
+            plans = '\n'.join(
+                line for entry in with_plan for line in entry['plan'])
+            self.assertIn('SEARCH', plans)
+        self.assertTrue(all(entry['path'] == '/profile/author/'
+                            for entry in entries))
+
+    def test_summary_command(self):
+        """Команда slow_queries выводит самые тяжёлые отпечатки."""
+        self.client.get(reverse('posts:index'))
+        stdout = StringIO()
+        call_command('slow_queries', '--top', '1', stdout=stdout)
+        output = stdout.getvalue()
+        self.assertEqual(output.count('раз, всего'), 1)
+        self.assertIn('SQL: SELECT', output)
+        self.assertIn('Места в коде:', output)
+
+    def test_failed_explain_keeps_transaction(self):
+        """Ошибка EXPLAIN — строка плана, транзакция остаётся рабочей."""
+        with transaction.atomic():
+            plan = slow_queries.explain(
+                connection, 'SELECT * FROM "missing_table"', [])
+            self.assertEqual(len(plan), 1)
+            self.assertIn('Не удалось получить план', plan[0])
+            self.assertEqual(Post.objects.count(), 1)
+
+    def test_plan_and_log_are_written_after_query(self):
+        """Обёртка только копит запросы: план и журнал — во flush."""
+        recorder = slow_queries.SlowQueryRecorder()
+        with mock.patch.object(slow_queries, 'write') as write, \
+                mock.patch.object(slow_queries, 'explain') as explain:
+            with connection.execute_wrapper(recorder):
+                Post.objects.count()
+            write.assert_not_called()
+            explain.assert_not_called()
+            self.assertEqual(len(recorder.pending), 1)
+            recorder.flush()
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(explain.call_count, 1)
+        self.assertEqual(recorder.pending, [])
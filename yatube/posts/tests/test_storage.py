@@ -0,0 +1,181 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .. import media, thumbnails
+from ..models import MediaFile, Post
+from ..storage import is_hashed_name, post_image_storage
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content=b'image'):
+        post = Post(author=self.user, text='Тестовый пост')
+        post.image.save('photo.JPG', ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def references(self, name):
+        return MediaFile.objects.get(name=name).references
+
+    def test_same_content_is_stored_once(self):
+        first = self.create_post()
+        second = self.create_post()
+        other = self.create_post(b'other image')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertTrue(is_hashed_name(first.image.name))
+        self.assertRegex(
+            first.image.name, r'^posts/(\w\w)/(\w\w)/\1\2\w{60}\.jpg$')
+        self.assertEqual(self.references(first.image.name), 2)
+
+    def test_file_deleted_with_last_reference(self):
+        first = self.create_post()
+        second = self.create_post()
+        name = first.image.name
+        first.delete()
+        self.assertFalse(media.delete_if_unused(name))
+        self.assertTrue(post_image_storage.exists(name))
+        second.delete()
+        self.assertTrue(media.delete_if_unused(name))
+        self.assertFalse(post_image_storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_replaced_image_is_released(self):
+        post = self.create_post()
+        old_name = post.image.name
+        post.image.save('new.jpg', ContentFile(b'new image'))
+        self.assertEqual(self.references(old_name), 0)
+        self.assertEqual(self.references(post.image.name), 1)
+        post.text = 'Изменённый текст'
+        post.save()
+        self.assertEqual(self.references(post.image.name), 1)
+
+    def test_migrate_media_storage(self):
+        legacy = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'legacy.jpg')
+        post = self.create_post()
+        with open(legacy, 'wb') as file:
+            file.write(b'legacy image')
+        Post.objects.filter(pk=post.pk).update(image='posts/legacy.jpg')
+        MediaFile.objects.create(name='posts/legacy.jpg', references=1)
+        out = StringIO()
+        call_command('migrate_media_storage', stdout=out)
+        post.refresh_from_db()
+        self.assertIn('Перенесено картинок: 1', out.getvalue())
+        self.assertTrue(is_hashed_name(post.image.name))
+        self.assertEqual(post.image.read(), b'legacy image')
+        self.assertTrue(media.delete_if_unused('posts/legacy.jpg'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GcMediaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content):
+        post = Post(author=self.user, text='Тестовый пост')
+        post.image.save('small.gif', ContentFile(content), save=False)
+        post.save()
+        thumbnails.generate(post.image.name)
+        return post
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command('gc_media', *args, '--min-age=0', stdout=out)
+        return out.getvalue()
+
+    def test_gc_media(self):
+        kept = self.create_post(SMALL_GIF)
+        orphan = self.create_post(SMALL_GIF + b'\0')
+        orphan_thumbnails = thumbnails.stored_thumbnails(orphan.image.name)
+        self.assertTrue(orphan_thumbnails)
+        # Пост теряет картинку в обход сигналов, и файл остаётся на диске.
+        Post.objects.filter(pk=orphan.pk).update(image='')
+        MediaFile.objects.filter(name=orphan.image.name).update(references=0)
+        stray = os.path.join(TEMP_MEDIA_ROOT, 'cache', 'stray.jpg')
+        with open(stray, 'wb') as file:
+            file.write(b'stray')
+
+        files = 2 + len(orphan_thumbnails)
+        out = self.gc('--dry-run')
+        self.assertIn(f'Можно удалить файлов: {files}', out)
+        self.assertIn(orphan.image.name, out)
+        self.assertTrue(post_image_storage.exists(orphan.image.name))
+        self.assertTrue(os.path.exists(stray))
+
+        out = self.gc()
+        self.assertIn(f'Удалено файлов: {files}', out)
+        self.assertFalse(post_image_storage.exists(orphan.image.name))
+        for thumbnail in orphan_thumbnails:
+            self.assertFalse(thumbnail.exists())
+        self.assertFalse(os.path.exists(stray))
+        self.assertTrue(post_image_storage.exists(kept.image.name))
+        for thumbnail in thumbnails.stored_thumbnails(kept.image.name):
+            self.assertTrue(thumbnail.exists())
+        self.assertIn('Удалено файлов: 0', self.gc())
+
+    def test_gc_media_keeps_counted_files(self):
+        """Файл со ссылкой в счётчике не удаляется, даже без поста."""
+        post = self.create_post(SMALL_GIF)
+        Post.objects.filter(pk=post.pk).update(image='')
+        self.gc()
+        self.assertTrue(post_image_storage.exists(post.image.name))
+
+    def test_reupload_refreshes_file_age(self):
+        """Повторная загрузка файла защищает его от gc по возрасту."""
+        post = self.create_post(SMALL_GIF)
+        path = post_image_storage.path(post.image.name)
+        os.utime(path, (0, 0))
+        post_image_storage.save('posts/again.gif', ContentFile(SMALL_GIF))
+        self.assertGreater(os.stat(path).st_mtime, 0)
+        Post.objects.filter(pk=post.pk).update(image='')
+        MediaFile.objects.filter(name=post.image.name).delete()
+        call_command('gc_media', stdout=StringIO())
+        self.assertTrue(post_image_storage.exists(post.image.name))
+
+    def test_gc_media_skips_files_removed_during_walk(self):
+        """Файл, удалённый во время обхода, пропускается."""
+        walk = os.walk
+
+        def walk_with_vanished_file(top, *args, **kwargs):
+            for path, dirnames, filenames in walk(top, *args, **kwargs):
+                yield path, dirnames, [*filenames, 'vanished.jpg']
+
+        with mock.patch('os.walk', walk_with_vanished_file):
+            self.assertIn('Удалено файлов:', self.gc())
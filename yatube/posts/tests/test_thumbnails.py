@@ -0,0 +1,126 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail import get_thumbnail
+
+from .. import thumbnails
+from ..models import Post
+from ..templatetags.post_cards import post_cards
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        thumbnails.local_cache.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        with mock.patch.object(thumbnails, 'generate_on_commit') as schedule:
+            post = Post.objects.create(
+                author=self.user,
+                text='Тестовый пост',
+                image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+            )
+        schedule.assert_called_once_with(post.image.name)
+        return post
+
+    def assert_thumbnails_exist(self, post):
+        for geometry, options in settings.POST_THUMBNAILS.values():
+            thumbnail = get_thumbnail(post.image.name, geometry, **options)
+            self.assertTrue(default_storage.exists(thumbnail.name))
+
+    def test_thumbnails_scheduled_only_for_new_image(self):
+        """Миниатюры строятся при смене картинки, но не текста."""
+        post = self.create_post()
+        post = Post.objects.get(pk=post.pk)
+        with mock.patch.object(thumbnails, 'generate_on_commit') as schedule:
+            post.text = 'Изменённый текст'
+            post.save()
+        schedule.assert_not_called()
+
+    def test_generate(self):
+        post = self.create_post()
+        self.assertEqual(
+            thumbnails.generate(post.image.name),
+            len(settings.POST_THUMBNAILS))
+        self.assert_thumbnails_exist(post)
+
+    def test_broken_image_is_logged(self):
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            self.assertEqual(thumbnails.generate('posts/missing.gif'), 0)
+
+    def test_pregenerate_command(self):
+        post = self.create_post()
+        out = StringIO()
+        call_command('pregenerate_thumbnails', workers=1, stdout=out)
+        self.assertIn('Картинок: 1', out.getvalue())
+        self.assert_thumbnails_exist(post)
+
+    def test_resolve_page_in_one_lookup(self):
+        """Миниатюры страницы находятся одним get_many без запросов к БД."""
+        posts = [self.create_post() for _ in range(3)]
+        names = [post.image.name for post in posts] + ['']
+        first = thumbnails.resolve(names)
+        self.assertEqual(set(first), {post.image.name for post in posts})
+        self.assertTrue(first[posts[0].image.name]['card_960'].url)
+        thumbnails.local_cache.clear()
+        with mock.patch.object(cache, 'get_many',
+                               wraps=cache.get_many) as get_many:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(thumbnails.resolve(names), first)
+        get_many.assert_called_once()
+        self.assertEqual(len(queries), 0)
+
+    def test_resolve_from_local_cache(self):
+        name = self.create_post().image.name
+        first = thumbnails.resolve([name])
+        with mock.patch.object(cache, 'get_many') as get_many:
+            self.assertEqual(thumbnails.resolve([name]), first)
+        get_many.assert_not_called()
+
+    def test_lru_cache_evicts_oldest(self):
+        lru = thumbnails.LRUCache(2)
+        lru.set_many({'a': 1, 'b': 2})
+        lru.get_many(['a'])
+        lru.set_many({'c': 3})
+        self.assertEqual(lru.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+    def test_card_has_srcset(self):
+        post = self.create_post()
+        card = post_cards([post])[0]
+        self.assertIn('srcset=', card)
+        for width in settings.POST_CARD_WIDTHS:
+            self.assertIn(f' {width}w', card)
@@ -0,0 +1,148 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import registry
+
+from ..models import Follow, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Пост до подписки')
+
+    def setUp(self):
+        cache.clear()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def timeline(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.follower).values_list('post_id', flat=True))
+
+    def test_follow_backfills_and_unfollow_cleans_timeline(self):
+        """Подписка заполняет ленту, отписка очищает её."""
+        self.follower_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.timeline(), [])
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает в ленты подписчиков в порядке публикации."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.timeline(), [new_post.pk, self.old_post.pk])
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['page_obj'].object_list,
+            [new_post, self.old_post]
+        )
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_popular_author_is_merged_at_read_time(self):
+        """Посты популярного автора вливаются в ленту при чтении."""
+        reader = User.objects.create_user(username='reader')
+        regular = User.objects.create_user(username='regular')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=reader, author=self.author)
+        Follow.objects.create(user=self.follower, author=regular)
+        popular_post = Post.objects.create(
+            author=self.author, text='Пост популярного автора')
+        regular_post = Post.objects.create(
+            author=regular, text='Пост обычного автора')
+        self.assertEqual(self.timeline(), [regular_post.pk,
+                                           self.old_post.pk])
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(
+            page_obj.object_list,
+            [regular_post, popular_post, self.old_post]
+        )
+        self.assertEqual(page_obj.paginator.merge_stats['streams'], 2)
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_merged_feed_is_paged_by_cursor_only(self):
+        """Слитая лента листается курсорами, а слияния видны в метриках."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=reader, author=self.author)
+        key = ('yatube_timeline_merge_streams', ())
+        before = registry.values.get(key, {'count': 0})['count']
+        response = self.follower_client.get(
+            reverse('posts:follow_index'), {'page': 5})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.object_list, [self.old_post])
+        self.assertEqual(page_obj.page_window, [])
+        self.assertEqual(page_obj.paginator.merge_stats['rows_fetched'], 2)
+        self.assertEqual(page_obj.paginator.merge_stats['rows_merged'], 1)
+        self.assertEqual(registry.values[key]['count'], before + 1)
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_author_crossing_threshold_up_and_down(self):
+        """Посты времени популярности раскладываются, когда она прошла."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.follower, author=self.author)
+        # Кэш популярных авторов заполнен до перехода через порог.
+        self.follower_client.get(reverse('posts:follow_index'))
+        Follow.objects.create(user=reader, author=self.author)
+        popular_post = Post.objects.create(
+            author=self.author, text='Пост популярного автора')
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['page_obj'].object_list,
+            [popular_post, self.old_post]
+        )
+        Follow.objects.filter(user=reader, author=self.author).delete()
+        # Отписка не раскладывает посты: их по-прежнему вливает чтение.
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['page_obj'].object_list,
+            [popular_post, self.old_post]
+        )
+        call_command('rebuild_timelines', '--pending', stdout=StringIO())
+        self.assertEqual(self.timeline(), [popular_post.pk, self.old_post.pk])
+        cache.clear()
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(
+            page_obj.object_list, [popular_post, self.old_post])
+        self.assertEqual(page_obj.paginator.merge_stats, {})
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2,
+                       TIMELINE_FANOUT_RESUME_THRESHOLD=1)
+    def test_fanout_resumes_below_hysteresis_band(self):
+        """Между порогами автор остаётся популярным."""
+        readers = [
+            User.objects.create_user(username=f'reader{index}')
+            for index in range(3)
+        ]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.author)
+        stats = UserStats.objects.filter(user=self.author)
+        self.assertEqual(stats.get().timeline_mode, UserStats.TIMELINE_MERGED)
+        Follow.objects.filter(user=readers[0]).delete()
+        self.assertEqual(stats.get().timeline_mode, UserStats.TIMELINE_MERGED)
+        Follow.objects.filter(user=readers[1]).delete()
+        self.assertEqual(
+            stats.get().timeline_mode, UserStats.TIMELINE_MATERIALIZING)
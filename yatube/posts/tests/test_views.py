@@ -6,6 +6,8 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.files.images import ImageFile
 from django.core.cache import cache
 from django.conf import settings
+import base64
+import json
 import tempfile
 import shutil
 from http import HTTPStatus
@@ -219,6 +221,119 @@ class PostPagesTests(TestCase):
                          'Проверка кэширования',
                          'Отсутствует кэш')
 
+    def test_cached_pages_are_per_user(self):
+        """Закэшированная страница одного пользователя не видна другим."""
+        url = reverse('posts:profile', kwargs={'username': self.post.author})
+        bob, alice = self.post.author, User.objects.create_user(
+            username='alice')
+        Follow.objects.create(user=alice, author=bob)
+        clients = {}
+        for user in (bob, alice):
+            clients[user.username] = Client()
+            clients[user.username].force_login(user)
+        clients['anonymous'] = Client()
+        responses = {
+            name: client.get(url) for name, client in clients.items()}
+        export = reverse('posts:profile_export', args=[bob.username])
+        self.assertContains(responses[bob.username], export)
+        for name in ('alice', 'anonymous'):
+            with self.subTest(name=name):
+                self.assertNotContains(responses[name], export)
+        self.assertTrue(responses['alice'].context['following'])
+        self.assertContains(responses['anonymous'], 'Войти')
+
+    def test_cache_served_until_generation_changes(self):
+        """Закэшированные страницы отдаются без запросов к БД, пока
+        не изменится пост, автор или группа."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.post.author}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    self.guest_client.get(url)
+        new_post = Post.objects.create(
+            text='Пост после кэширования',
+            author=self.post.author,
+            group=self.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), new_post.text)
+        self.group.title = 'Новое название группы'
+        self.group.save()
+        response = self.guest_client.get(urls[1])
+        self.assertContains(response, self.group.title)
+
+    def test_feeds_not_modified_until_generation_changes(self):
+        """Лента с совпавшим ETag отдаётся как 304 без рендеринга."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.post.author}),
+        )
+        etags = {}
+        for url in urls:
+            with self.subTest(url=url):
+                etags[url] = self.guest_client.get(url)['ETag']
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response.templates, [])
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        Post.objects.create(
+            text='Новый пост', author=self.post.author, group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], etags[url])
+
+    def test_post_detail_not_modified_until_commented(self):
+        """Страница поста отдаётся как 304, пока нет новых комментариев."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.templates, [])
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Новый комментарий')
+
+        comment = Comment.objects.latest('pk')
+        etag = self.guest_client.get(url)['ETag']
+        comment.delete()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_post_detail_etag_changes_with_csrf_token(self):
+        """После нового входа страница с формой не отдаётся как 304."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        client = Client()
+        client.force_login(self.user)
+        # Первый ответ выдаёт CSRF-куку, второй уже строит ETag по ней.
+        client.get(url)
+        etag = client.get(url)['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        client.logout()
+        client.force_login(self.user)
+        client.get(url)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
 
 class PaginatorViewsTest(TestCase):
     FIRST_PAGE_POSTS = 10
@@ -304,6 +419,90 @@ class PaginatorViewsTest(TestCase):
             len(response.context['page_obj']), self.SECOND_PAGE_POSTS
         )
 
+    def test_cursor_pages_index(self):
+        """Проверка листания index по курсорам after/before"""
+        url = reverse('posts:index')
+        first_page = self.authorized_client.get(url).context['page_obj']
+        response = self.authorized_client.get(
+            url, {'after': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), self.SECOND_PAGE_POSTS)
+        self.assertIsNone(second_page.next_cursor)
+        self.assertFalse(
+            set(first_page.object_list) & set(second_page.object_list))
+        response = self.authorized_client.get(
+            url, {'before': second_page.previous_cursor})
+        self.assertEqual(
+            response.context['page_obj'].object_list, first_page.object_list
+        )
+
+    def test_cursor_pages_keep_page_window(self):
+        """Страницы по курсорам выводят окно номеров страниц"""
+        url = reverse('posts:index')
+        first_page = self.authorized_client.get(url).context['page_obj']
+        response = self.authorized_client.get(
+            url, {'after': first_page.next_cursor, 'page': 2})
+        second_page = response.context['page_obj']
+        self.assertEqual(second_page.number, 2)
+        self.assertEqual(second_page.page_window, [1, 2])
+        self.assertContains(
+            response, f'before={second_page.previous_cursor}&page=1')
+        response = self.authorized_client.get(
+            url, {'before': second_page.previous_cursor, 'page': 'x'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        response = self.authorized_client.get(url, {'page': 'last'})
+        self.assertEqual(response.context['page_obj'].page_window, [1, 2])
+
+    def test_last_page_profile(self):
+        """Последняя страница profile выбирается без номера страницы"""
+        response = self.authorized_client.get(
+            reverse('posts:profile',
+                    kwargs={'username': self.post[self.FIRST_POST].author}),
+            {'page': 'last'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), self.FIRST_PAGE_POSTS)
+        self.assertEqual(page_obj[len(page_obj) - 1].text,
+                         self.post[self.FIRST_POST].text)
+        self.assertIsNotNone(page_obj.previous_cursor)
+        self.assertIsNone(page_obj.next_cursor)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор не ломает страницу"""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'after': 'broken!'})
+        self.assertEqual(
+            len(response.context['page_obj']), self.FIRST_PAGE_POSTS
+        )
+
+
+    def test_crafted_cursor_values_return_first_page(self):
+        """Курсор с чужими типами значений не ломает страницу."""
+        def token(values):
+            data = json.dumps(values).encode()
+            return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+        tokens = (
+            ['x', 'y'],
+            ['2020-01-01T00:00:00+00:00', 'y'],
+            [{'a': 1}, 1],
+            [None, None],
+            ['2020-13-45T00:00:00', 1],
+        )
+        urls = (
+            (reverse('posts:index'), {}),
+            (reverse('posts:search'), {'q': 'пост'}),
+        )
+        for url, params in urls:
+            for values in tokens:
+                for direction in ('after', 'before'):
+                    with self.subTest(url=url, values=values,
+                                      direction=direction):
+                        response = self.authorized_client.get(
+                            url, {**params, direction: token(values)})
+                        self.assertEqual(
+                            response.status_code, HTTPStatus.OK)
+
 
 class FollowUsersTests(TestCase):
     @classmethod
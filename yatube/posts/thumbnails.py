@@ -0,0 +1,176 @@
+"""Миниатюры картинок постов.
+
+Без подготовки первый зритель поста ждёт, пока картинка декодируется и
+уменьшается. Поэтому после сохранения поста с новой картинкой все
+миниатюры из ``POST_THUMBNAILS`` строятся в пуле потоков — уже после
+фиксации транзакции и вне потока запроса.
+
+Карточки лент не обращаются к хранилищу ключей sorl по разу на каждый
+тег ``{% thumbnail %}``: ``resolve`` находит миниатюры всех картинок
+страницы одним ``get_many`` кэша, перед которым стоит LRU процесса.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+logger = logging.getLogger(__name__)
+
+Thumbnail = namedtuple('Thumbnail', 'url width height')
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def generate(name):
+    """Построить все миниатюры картинки ``name``.
+
+    Возвращает число готовых миниатюр; ошибки пишутся в лог, чтобы
+    одна битая картинка не останавливала остальные.
+    """
+    generated = 0
+    try:
+        for geometry, options in settings.POST_THUMBNAILS.values():
+            # Ошибки чтения картинки sorl логирует сам и возвращает
+            # миниатюру, которой нет в хранилище.
+            if get_thumbnail(name, geometry, **options).exists():
+                generated += 1
+            else:
+                logger.error('Миниатюра %s %s не построена', name, geometry)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', name)
+    return generated
+
+
+def generate_in_worker(name):
+    """``generate`` для потока пула: закрывает соединения потока с БД."""
+    try:
+        return generate(name)
+    finally:
+        # Хранилище ключей sorl открывает в потоке своё соединение.
+        connections.close_all()
+
+
+def generate_on_commit(name):
+    """Построить миниатюры в пуле потоков после фиксации транзакции.
+
+    Если ``POST_THUMBNAIL_WORKERS`` равен нулю, миниатюры строятся
+    сразу после фиксации в текущем потоке.
+    """
+    if settings.POST_THUMBNAIL_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(generate_in_worker, name))
+    else:
+        transaction.on_commit(lambda: generate(name))
+
+
+def stored_thumbnails(name):
+    """Миниатюры картинки ``name``, известные хранилищу ключей sorl."""
+    # У sorl нет открытого способа перечислить миниатюры картинки; так же
+    # их находит его собственный KVStoreBase.delete_thumbnails.
+    kvstore = default.kvstore
+    keys = kvstore._get(ImageFile(name).key, identity='thumbnails') or []
+    return [image for image in map(kvstore._get, keys) if image]
+
+
+def known_thumbnails(names):
+    """Те из файлов ``names``, что есть в хранилище ключей sorl.
+
+    Одним запросом к таблице sorl: хранилище ключей проекта —
+    ``cached_db``, и его кэш для такой проверки не нужен.
+    """
+    keys = {add_prefix(ImageFile(name).key): name for name in names}
+    found = KVStore.objects.filter(key__in=keys).values_list('key', flat=True)
+    return {keys[key] for key in found}
+
+
+class LRUCache:
+    """Потокобезопасный словарь, забывающий давно не читанные ключи."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.items:
+                    self.items.move_to_end(key)
+                    found[key] = self.items[key]
+        return found
+
+    def set_many(self, items):
+        with self.lock:
+            for key, value in items.items():
+                self.items[key] = value
+                self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+local_cache = LRUCache(settings.POST_THUMBNAIL_LRU_SIZE)
+
+
+def thumbnail_key(name, geometry, options):
+    state = repr((name, geometry, sorted(options.items())))
+    return 'posts:thumbnail:' + hashlib.md5(state.encode()).hexdigest()
+
+
+def resolve(names):
+    """Миниатюры картинок ``names``: ``{имя: {псевдоним: Thumbnail}}``.
+
+    Миниатюры ищутся в LRU процесса, затем одним ``get_many`` в кэше;
+    только оставшиеся запрашиваются у sorl и записываются одним
+    ``set_many``. Непостроенные миниатюры не кэшируются.
+    """
+    wanted = {
+        thumbnail_key(name, geometry, options):
+            (name, alias, geometry, options)
+        for name in set(filter(None, names))
+        for alias, (geometry, options) in settings.POST_THUMBNAILS.items()
+    }
+    found = local_cache.get_many(wanted)
+    missing = [key for key in wanted if key not in found]
+    if missing:
+        cached = cache.get_many(missing)
+        local_cache.set_many(cached)
+        found.update(cached)
+    resolved = {}
+    for key, (name, alias, geometry, options) in wanted.items():
+        if key not in found:
+            image = get_thumbnail(name, geometry, **options)
+            if image.exists():
+                resolved[key] = Thumbnail(image.url, image.width, image.height)
+    if resolved:
+        cache.set_many(resolved, settings.POST_THUMBNAIL_CACHE_TIMEOUT)
+        local_cache.set_many(resolved)
+        found.update(resolved)
+    thumbnails = {}
+    for key, (name, alias, geometry, options) in wanted.items():
+        if key in found:
+            thumbnails.setdefault(name, {})[alias] = found[key]
+    return thumbnails
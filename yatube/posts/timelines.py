@@ -0,0 +1,309 @@
+"""Материализованные ленты подписок.
+
+Каждая запись ленты — копия ключа (pub_date, id) поста в ленте
+подписчика автора. Ленты заполняются при публикации поста и при
+подписке, а страница ``follow_index`` читает готовый отсортированный
+срез одной ленты по индексу (user, -pub_date, -post).
+
+Посты авторов, у которых подписчиков больше
+``TIMELINE_FANOUT_THRESHOLD``, по лентам не раскладываются: при чтении
+они вливаются в ленту отдельными потоками (см. ``timeline_streams``).
+Режим автора хранится в ``UserStats.timeline_mode``. Назад к раскладке
+автор переходит, только когда подписчиков станет не больше
+``TIMELINE_FANOUT_RESUME_THRESHOLD``: тогда он ждёт раскладки, а его
+посты по-прежнему вливаются при чтении. Сами посты раскладывает по
+лентам команда ``rebuild_timelines --pending`` пачками, вне запросов.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+
+from .counters import iter_batches
+from .models import Follow, Post, TimelineEntry, UserStats
+
+FEED_KEYS = ('feed_date', 'feed_post')
+POST_KEYS = ('pub_date', 'id')
+CELEBRITIES_CACHE_KEY = 'posts:timeline:celebrities'
+
+FANOUT = UserStats.TIMELINE_FANOUT
+MERGED = UserStats.TIMELINE_MERGED
+MATERIALIZING = UserStats.TIMELINE_MATERIALIZING
+
+logger = logging.getLogger(__name__)
+
+
+def resume_threshold():
+    """Число подписчиков, при котором раскладка по лентам возобновляется."""
+    return min(settings.TIMELINE_FANOUT_RESUME_THRESHOLD,
+               settings.TIMELINE_FANOUT_THRESHOLD)
+
+
+def is_celebrity(author_id):
+    """Вливаются ли посты автора в ленты при чтении вместо раскладки."""
+    if settings.TIMELINE_FANOUT_THRESHOLD is None:
+        return False
+    return UserStats.objects.filter(
+        user_id=author_id, timeline_mode=MERGED).exists()
+
+
+def _modes():
+    """Авторы, вливаемые при чтении, и ждущие раскладки: из кэша."""
+    if settings.TIMELINE_FANOUT_THRESHOLD is None:
+        return frozenset(), frozenset()
+    modes = cache.get(CELEBRITIES_CACHE_KEY)
+    if modes is None:
+        rows = UserStats.objects.filter(
+            timeline_mode__in=(MERGED, MATERIALIZING)
+        ).values_list('user_id', 'timeline_mode')
+        modes = (
+            frozenset(pk for pk, mode in rows if mode == MERGED),
+            frozenset(pk for pk, mode in rows if mode == MATERIALIZING),
+        )
+        cache.set(CELEBRITIES_CACHE_KEY, modes,
+                  settings.TIMELINE_CELEBRITIES_TIMEOUT)
+    return modes
+
+
+def celebrity_ids():
+    """Авторы, чьи новые посты по лентам не раскладываются."""
+    return _modes()[0]
+
+
+def merged_author_ids():
+    """Авторы, чьи посты вливаются в ленты при чтении.
+
+    Кроме популярных авторов это авторы, которые ждут раскладки: их
+    посты в лентах пока есть не все.
+    """
+    merged, pending = _modes()
+    return merged | pending
+
+
+def forget_celebrities():
+    """Сбросить кэш популярных авторов сейчас и после коммита.
+
+    Повторный сброс после коммита не даёт параллельному запросу
+    закэшировать список, прочитанный до коммита.
+    """
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(CELEBRITIES_CACHE_KEY))
+
+
+def followers_changed(author_id, delta):
+    """Сменить режим автора после сдвига счётчика подписчиков на ``delta``.
+
+    Автор с числом подписчиков больше ``TIMELINE_FANOUT_THRESHOLD``
+    начинает вливаться в ленты при чтении. Автор, у которого их стало
+    не больше ``TIMELINE_FANOUT_RESUME_THRESHOLD``, ждёт раскладки:
+    сама раскладка в запросе не выполняется.
+    """
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    if threshold is None:
+        return
+    stats = UserStats.objects.filter(user_id=author_id)
+    if delta > 0:
+        changed = stats.filter(followers_count__gt=threshold).exclude(
+            timeline_mode=MERGED).update(timeline_mode=MERGED)
+    else:
+        changed = stats.filter(
+            timeline_mode=MERGED,
+            followers_count__lte=resume_threshold(),
+        ).update(timeline_mode=MATERIALIZING)
+        if changed:
+            logger.info(
+                'У автора %s подписчиков не больше %s: посты ждут '
+                'раскладки по лентам', author_id, resume_threshold()
+            )
+    if changed:
+        forget_celebrities()
+
+
+def sync_modes():
+    """Привести режимы всех авторов в соответствие с их счётчиками.
+
+    Нужно после пересчёта счётчиков или смены порогов. Возвращает
+    число авторов, сменивших режим.
+    """
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    if threshold is None:
+        return 0
+    changed = UserStats.objects.filter(
+        followers_count__gt=threshold).exclude(
+        timeline_mode=MERGED).update(timeline_mode=MERGED)
+    changed += UserStats.objects.filter(
+        timeline_mode=MERGED, followers_count__lte=resume_threshold(),
+    ).update(timeline_mode=MATERIALIZING)
+    if changed:
+        forget_celebrities()
+    return changed
+
+
+def pending_author_ids():
+    """Авторы, ждущие раскладки постов по лентам."""
+    return list(UserStats.objects.filter(
+        timeline_mode=MATERIALIZING).order_by('user_id').values_list(
+        'user_id', flat=True))
+
+
+def materialize(author_id):
+    """Разложить по лентам посты автора, ждущего раскладки.
+
+    Посты берутся пачками по ``TIMELINE_BATCH_SIZE``, каждая пачка —
+    отдельная транзакция. Возвращает число добавленных записей лент.
+    """
+    inserted = 0
+    posts = Post.objects.filter(author_id=author_id)
+    for post_ids in iter_batches(posts, settings.TIMELINE_BATCH_SIZE):
+        with transaction.atomic():
+            inserted += _insert_select(
+                'f.author_id = %s AND p.id IN ({})'.format(
+                    ', '.join(['%s'] * len(post_ids))),
+                [author_id, *post_ids],
+            )
+    # Автор мог снова стать популярным, пока шла раскладка.
+    if UserStats.objects.filter(
+            user_id=author_id, timeline_mode=MATERIALIZING
+    ).update(timeline_mode=FANOUT):
+        forget_celebrities()
+    return inserted
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    """Добавить пост в ленты всех подписчиков автора."""
+    if is_celebrity(post.author_id):
+        logger.debug(
+            'Пост %s автора %s не раскладывается по лентам: '
+            'подписчиков больше %s', post.pk, post.author_id,
+            settings.TIMELINE_FANOUT_THRESHOLD
+        )
+        if post.author_id not in celebrity_ids():
+            forget_celebrities()
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def fan_out_many(posts):
+    """Разложить по лентам пачку постов ``(id, author_id, pub_date)``.
+
+    Для постов, созданных в обход сигналов (``bulk_create``):
+    подписчики всех авторов пачки читаются одним запросом.
+    """
+    celebrities = celebrity_ids()
+    posts = [post for post in posts if post[1] not in celebrities]
+    followers = {}
+    rows = Follow.objects.filter(
+        author_id__in={author_id for _, author_id, _ in posts}
+    ).values_list('author_id', 'user_id')
+    for author_id, user_id in rows.iterator():
+        followers.setdefault(author_id, []).append(user_id)
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, author_id, pub_date in posts
+        for user_id in followers.get(author_id, ())
+    )
+
+
+def _insert_select(where, params):
+    """Записи лент подписчиков для постов, отобранных условием ``where``.
+
+    В условии доступны подписки ``f`` и посты ``p`` их авторов.
+    """
+    entries, follows, posts = (
+        model._meta.db_table for model in (TimelineEntry, Follow, Post))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {entries} (user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date FROM {follows} f '
+            f'JOIN {posts} p ON p.author_id = f.author_id '
+            f'WHERE {where} '
+            'ON CONFLICT DO NOTHING',
+            params,
+        )
+        return cursor.rowcount
+
+
+def fan_out_authors(author_ids):
+    """Разложить все посты авторов ``author_ids`` по лентам подписчиков.
+
+    Один запрос ``INSERT … SELECT`` на всю пачку авторов — для массовой
+    загрузки данных, когда раскладка по посту слишком медленная.
+    """
+    celebrities = celebrity_ids()
+    author_ids = [pk for pk in author_ids if pk not in celebrities]
+    if not author_ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    return _insert_select(f'f.author_id IN ({placeholders})', author_ids)
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту подписчика все посты автора."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date')
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def remove(user_id, author_id):
+    """Убрать из ленты подписчика посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user_id):
+    """Пересобрать ленту пользователя по его подпискам."""
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        authors = Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True)
+        for author_id in authors:
+            backfill(user_id, author_id)
+
+
+def timeline_streams(user):
+    """Потоки ленты подписок для ``MergedCursorPaginator``.
+
+    Первый поток — материализованная лента пользователя, далее по
+    потоку на каждого популярного автора из его подписок.
+    """
+    streams = [(timeline_posts(user), FEED_KEYS)]
+    celebrities = merged_author_ids()
+    if celebrities:
+        followed = Follow.objects.filter(
+            user=user, author_id__in=celebrities
+        ).values_list('author_id', flat=True)
+        streams.extend(
+            (Post.objects.filter(author_id=author_id), POST_KEYS)
+            for author_id in followed
+        )
+    return streams
+
+
+def timeline_posts(user):
+    """Посты ленты подписок в порядке ключей ``FEED_KEYS``."""
+    return Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_post=F('timeline_entries__post'),
+    )
@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+
+from yatube.settings import POSTS_PER_PAGE
+from .paginators import CursorPaginator
+
+
+def paginate(request, post_list, paginator_class=CursorPaginator, **kwargs):
+    """Страница ленты по параметрам ``page``, ``after`` и ``before``."""
+    paginator = paginator_class(post_list, POSTS_PER_PAGE, **kwargs)
+    return paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+@contextmanager
+def preserved_dates(model, *field_names):
+    """Не подменять даты полей ``auto_now``/``auto_now_add`` при вставке.
+
+    Для ``bulk_create`` записей с заранее известными датами.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
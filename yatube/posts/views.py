@@ -1,30 +1,42 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
+from . import export
 from .forms import PostForm, CommentForm
+from . import generations
+from .conditional import condition_by_generation, post_condition
+from .counters import get_user_stats
+from .generations import cache_page_by_generation
 from .models import Post, Group, User, Follow
-from yatube.settings import POSTS_PER_PAGE
+from .paginators import MergedCursorPaginator
+from .search import highlight, search_posts
+from .timelines import timeline_streams
+from .utils import paginate
 
 
-@cache_page(5, key_prefix='index_page')
+@transaction.non_atomic_requests
+@condition_by_generation(generations.index_scopes)
+@cache_page_by_generation(generations.index_scopes)
 def index(request):
     post_list = Post.objects.select_related('author', 'group')
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, post_list, count_key='posts:count:index')
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@transaction.non_atomic_requests
+@condition_by_generation(generations.group_scopes)
+@cache_page_by_generation(generations.group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.group_posts.order_by('-pub_date')
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.group_posts.select_related('author', 'group')
+    page_obj = paginate(
+        request, posts, count_key=f'posts:count:group:{group.pk}')
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -32,12 +44,14 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@transaction.non_atomic_requests
+@condition_by_generation(generations.profile_scopes)
+@cache_page_by_generation(generations.profile_scopes)
 def profile(request, username):
     user = get_object_or_404(User, username=username)
-    posts = user.posts.order_by('-pub_date')
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    stats = get_user_stats(user)
+    posts = user.posts.select_related('author', 'group')
+    page_obj = paginate(request, posts, count=stats.posts_count)
     following = None
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -50,8 +64,49 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@login_required
+@transaction.non_atomic_requests
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if author != request.user:
+        return redirect('posts:profile', username)
+    fmt = request.GET.get('format')
+    if fmt not in export.FORMATS:
+        fmt = export.FORMATS[0]
+    compress = 'gzip' in request.GET
+    response = StreamingHttpResponse(
+        export.export('posts', fmt, compress, queryset=author.posts.all()),
+        content_type=(
+            'application/gzip' if compress else export.CONTENT_TYPES[fmt]),
+    )
+    name = f'{username}-' + export.filename('posts', fmt, compress)
+    response['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
+
+@transaction.non_atomic_requests
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        posts = search_posts(
+            query, Post.objects.select_related('author', 'group'))
+        page_obj = paginate(request, posts, keys=('search_rank', 'id'))
+        for post in page_obj:
+            post.search_html = highlight(post.search_snippet)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'query_prefix': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@transaction.non_atomic_requests
+@post_condition
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     is_edit = None
     form = CommentForm(request.POST or None)
     if post.author == request.user:
@@ -60,7 +115,7 @@ def post_detail(request, post_id):
         'post': post,
         'is_edit': is_edit,
         'form': form,
-        # 'comments': comments
+        'comments': post.comments.select_related('author'),
     }
     return render(request, 'posts/post_detail.html', context)
 
@@ -68,7 +123,7 @@ def post_detail(request, post_id):
 @login_required
 def post_create(request):
     if request.method == 'POST':
-        form = PostForm(request.POST)
+        form = PostForm(request.POST, files=request.FILES or None)
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
@@ -112,12 +167,16 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@transaction.non_atomic_requests
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    streams = [
+        (posts.select_related('author', 'group'), keys)
+        for posts, keys in timeline_streams(request.user)
+    ]
+    page_obj = paginate(
+        request, streams, paginator_class=MergedCursorPaginator,
+        count_key=f'posts:count:follow:{request.user.pk}')
     context = {
         'page_obj': page_obj,
     }
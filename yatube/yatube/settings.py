@@ -27,6 +27,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -40,7 +42,7 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.MeteredDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -61,6 +63,7 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ATOMIC_REQUESTS': True,
     }
 }
 
@@ -92,6 +95,56 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 POSTS_PER_PAGE = 10
+PAGINATOR_COUNT_TIMEOUT = 60
+PAGINATOR_EXACT_COUNT_LIMIT = 10000
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+TIMELINE_BATCH_SIZE = 1000
+TIMELINE_FANOUT_THRESHOLD = 10000
+# Автор, чьи посты вливаются в ленты при чтении, возвращается к раскладке
+# по лентам, только когда подписчиков станет не больше этого числа: без
+# зазора отписка и подписка на пороге пересобирали бы ленты каждый раз.
+TIMELINE_FANOUT_RESUME_THRESHOLD = 9000
+TIMELINE_CELEBRITIES_TIMEOUT = 300
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_JPEG_QUALITY = 85
+# Миниатюры картинок постов по псевдонимам: строятся сразу после
+# загрузки картинки. Карточки лент выводят миниатюры 'card_<ширина>'
+# через srcset, браузер выбирает ширину по sizes.
+POST_CARD_WIDTHS = (320, 640, 960)
+POST_CARD_SIZES = '(max-width: 992px) 100vw, 960px'
+POST_THUMBNAILS = {
+    f'card_{width}': (
+        f'{width}x{round(width * 339 / 960)}',
+        {'crop': 'center', 'upscale': True},
+    )
+    for width in POST_CARD_WIDTHS
+}
+# 0 — строить миниатюры в потоке запроса сразу после фиксации. Так
+# делает фикстура в conftest.py для pytest: фикстуры тестов удаляют
+# MEDIA_ROOT сразу после запроса, и запись из фонового потока мешала бы
+# этому.
+POST_THUMBNAIL_WORKERS = 2
+POST_THUMBNAIL_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+POST_THUMBNAIL_LRU_SIZE = 1000
+# Каталог, где процессы сбрасывают метрики для общего /metrics; без
+# него /metrics показывает метрики одного процесса.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+# Без токена /metrics открыт адресам METRICS_ALLOWED_IPS. За прокси на
+# том же хосте это все запросы: задайте токен или закройте /metrics на
+# прокси.
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# Запросы дольше порога (мс) пишутся в журнал с планом выполнения;
+# None — журнал выключен.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'logs', 'slow_queries.jsonl')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+SLOW_QUERY_EXPLAIN_INTERVAL = 60 * 10
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
@@ -101,6 +154,6 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.metrics.MeteredLocMemCache',
     }
 }